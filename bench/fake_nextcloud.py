@@ -0,0 +1,202 @@
+import asyncio
+import uuid
+from collections import Counter
+from email.utils import formatdate
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+
+DAV_PREFIX = "/remote.php/dav/"
+SHARES_PATH = "/ocs/v2.php/apps/files_sharing/api/v1/shares"
+
+
+class _Entry:
+    __slots__ = ("is_dir", "size", "etag", "mtime")
+
+    def __init__(self, is_dir: bool, size: int = 0) -> None:
+        self.is_dir = is_dir
+        self.size = size
+        self.etag = uuid.uuid4().hex
+        self.mtime = formatdate(usegmt=True)
+
+
+class FakeNextCloud:
+    """In-memory stand-in for the WebDAV and OCS share endpoints the bot talks to.
+
+    Only sizes are kept, not contents. Every request sleeps ``latency`` seconds first.
+    Covers MKCOL/PUT/HEAD/PROPFIND/MOVE/COPY/DELETE on ``files/`` and ``uploads/``
+    (chunked upload v2, assembled on ``MOVE .file``) and listing/creating public shares.
+    """
+
+    def __init__(self, user: str = "bench", latency: float = 0.0) -> None:
+        self.user = user
+        self.latency = latency
+        self.base_url = ""
+        self.requests: Counter = Counter()
+        self.bytes_received = 0
+        self._tree: Dict[str, _Entry] = {
+            "files": _Entry(True),
+            f"files/{user}": _Entry(True),
+            "uploads": _Entry(True),
+            f"uploads/{user}": _Entry(True),
+        }
+        self._shares: Dict[str, str] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route("*", SHARES_PATH, self._shares_handler)
+        app.router.add_route("*", DAV_PREFIX + "{path:.*}", self._dav_handler)
+        return app
+
+    def files(self, prefix: str = "") -> List[Tuple[str, int]]:
+        """(path, size) of every stored file under ``files/<user>/<prefix>``."""
+        root = f"files/{self.user}/{prefix.strip('/')}".rstrip("/")
+        return sorted((k[len(f"files/{self.user}/"):], e.size) for k, e in self._tree.items() if not e.is_dir and k.startswith(root))
+
+    @staticmethod
+    def _key(raw: str) -> str:
+        return unquote(raw).strip("/")
+
+    def _dest_key(self, request: web.Request) -> Optional[str]:
+        destination = request.headers.get("Destination")
+        if not destination:
+            return None
+        path = urlparse(destination).path
+        if not path.startswith(DAV_PREFIX):
+            return None
+        return self._key(path[len(DAV_PREFIX):])
+
+    @staticmethod
+    def _parent(key: str) -> str:
+        return key.rsplit("/", 1)[0] if "/" in key else ""
+
+    def _subtree(self, key: str) -> List[str]:
+        return [k for k in self._tree if k == key or k.startswith(key + "/")]
+
+    async def _dav_handler(self, request: web.Request) -> web.StreamResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        method = request.method
+        self.requests[method] += 1
+        key = self._key(request.match_info["path"])
+        handler = getattr(self, f"_do_{method.lower()}", None)
+        if handler is None:
+            return web.Response(status=405)
+        return await handler(request, key)
+
+    async def _do_mkcol(self, request: web.Request, key: str) -> web.Response:
+        if key in self._tree:
+            return web.Response(status=405)
+        parent = self._tree.get(self._parent(key))
+        if parent is None or not parent.is_dir:
+            return web.Response(status=409)
+        self._tree[key] = _Entry(True)
+        return web.Response(status=201)
+
+    async def _do_put(self, request: web.Request, key: str) -> web.Response:
+        parent = self._tree.get(self._parent(key))
+        if parent is None or not parent.is_dir:
+            return web.Response(status=409)
+        if key in self._tree and request.headers.get("If-None-Match") == "*":
+            return web.Response(status=412)
+        size = 0
+        async for chunk in request.content.iter_chunked(256 * 1024):
+            size += len(chunk)
+        self.bytes_received += size
+        existed = key in self._tree
+        self._tree[key] = _Entry(False, size)
+        return web.Response(status=204 if existed else 201)
+
+    async def _do_head(self, request: web.Request, key: str) -> web.Response:
+        entry = self._tree.get(key)
+        if entry is None:
+            return web.Response(status=404)
+        return web.Response(status=200, headers={"ETag": f'"{entry.etag}"'})
+
+    async def _do_propfind(self, request: web.Request, key: str) -> web.Response:
+        entry = self._tree.get(key)
+        if entry is None:
+            return web.Response(status=404)
+        keys = [key]
+        if entry.is_dir and request.headers.get("Depth", "1") != "0":
+            keys += sorted(k for k in self._tree if self._parent(k) == key and k != key)
+        body = ['<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">']
+        for k in keys:
+            e = self._tree[k]
+            href = escape(DAV_PREFIX + quote(k) + ("/" if e.is_dir else ""))
+            resourcetype = "<d:collection/>" if e.is_dir else ""
+            length = "" if e.is_dir else f"<d:getcontentlength>{e.size}</d:getcontentlength>"
+            body.append(
+                f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>"
+                f"<d:resourcetype>{resourcetype}</d:resourcetype>{length}"
+                f'<d:getetag>"{e.etag}"</d:getetag><d:getlastmodified>{e.mtime}</d:getlastmodified>'
+                "</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+            )
+        body.append("</d:multistatus>")
+        return web.Response(status=207, text="".join(body), content_type="application/xml")
+
+    def _place(self, request: web.Request, src: str, copy: bool) -> web.Response:
+        dst = self._dest_key(request)
+        if dst is None:
+            return web.Response(status=400)
+        if src.startswith("uploads/") and src.endswith("/.file"):
+            # Chunked upload v2 assembly
+            upload_dir = self._parent(src)
+            if upload_dir not in self._tree:
+                return web.Response(status=404)
+            if dst in self._tree and request.headers.get("Overwrite", "T") == "F":
+                return web.Response(status=412)
+            size = sum(e.size for k, e in self._tree.items() if self._parent(k) == upload_dir and not e.is_dir)
+            for k in self._subtree(upload_dir):
+                del self._tree[k]
+            existed = dst in self._tree
+            self._tree[dst] = _Entry(False, size)
+            return web.Response(status=204 if existed else 201)
+        if src not in self._tree:
+            return web.Response(status=404)
+        if self._parent(dst) not in self._tree:
+            return web.Response(status=409)
+        existed = dst in self._tree
+        if existed and request.headers.get("Overwrite", "T") == "F":
+            return web.Response(status=412)
+        for k in self._subtree(dst):
+            del self._tree[k]
+        for k in self._subtree(src):
+            e = self._tree[k]
+            self._tree[dst + k[len(src):]] = _Entry(e.is_dir, e.size)
+            if not copy:
+                del self._tree[k]
+        return web.Response(status=204 if existed else 201)
+
+    async def _do_move(self, request: web.Request, key: str) -> web.Response:
+        return self._place(request, key, copy=False)
+
+    async def _do_copy(self, request: web.Request, key: str) -> web.Response:
+        return self._place(request, key, copy=True)
+
+    async def _do_delete(self, request: web.Request, key: str) -> web.Response:
+        keys = self._subtree(key)
+        if not keys:
+            return web.Response(status=404)
+        for k in keys:
+            del self._tree[k]
+        return web.Response(status=204)
+
+    async def _shares_handler(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests["OCS"] += 1
+        if request.method == "GET":
+            data = [{"path": path, "url": url} for path, url in self._shares.items()]
+            return web.json_response({"ocs": {"meta": {"status": "ok"}, "data": data}})
+        if request.method == "POST":
+            form = await request.post()
+            path = str(form.get("path", ""))
+            if self._key(f"files/{self.user}/{path}") not in self._tree:
+                return web.json_response({"ocs": {"meta": {"status": "failure"}, "data": []}}, status=404)
+            url = self._shares.setdefault(path, f"{self.base_url}/s/{uuid.uuid4().hex[:15]}")
+            return web.json_response({"ocs": {"meta": {"status": "ok"}, "data": {"path": path, "url": url}}})
+        return web.Response(status=405)
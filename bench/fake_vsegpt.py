@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import random
+from collections import Counter
+
+from aiohttp import web
+
+
+_WORDS = (
+    "энергия система уравнение производная интеграл функция предел матрица вектор скорость "
+    "давление температура процесс модель граница условие решение метод пример теорема"
+).split()
+
+_CONSPECT = """# {title}
+
+## Основные понятия
+
+- {w0} и {w1} связаны соотношением $E = m c^2$.
+- Для {w2} справедливо $$\\int_0^1 f(x)\\,dx = F(1) - F(0).$$
+
+## Выводы
+
+1. {w3} определяется начальными условиями.
+2. Предел $\\lim_{{n \\to \\infty}} (1 + 1/n)^n = e$.
+
+{body}
+"""
+
+
+class FakeVseGPT:
+    """Stand-in for ``/audio/transcriptions`` and ``/chat/completions``.
+
+    Transcription takes ``stt_latency`` plus ``stt_seconds_per_mb`` per uploaded megabyte;
+    completions take ``llm_latency``. Replies are derived from the request content, so
+    different inputs never collide in the bot's result cache.
+    """
+
+    def __init__(self, stt_latency: float = 0.5, stt_seconds_per_mb: float = 0.0, llm_latency: float = 1.0, words: int = 600) -> None:
+        self.stt_latency = stt_latency
+        self.stt_seconds_per_mb = stt_seconds_per_mb
+        self.llm_latency = llm_latency
+        self.words = words
+        self.requests: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/audio/transcriptions", self._transcriptions)
+        app.router.add_post("/chat/completions", self._completions)
+        return app
+
+    def _text(self, seed: str, words: int) -> str:
+        rng = random.Random(seed)
+        return " ".join(rng.choice(_WORDS) for _ in range(words)) + f" ({seed[:12]})"
+
+    async def _transcriptions(self, request: web.Request) -> web.Response:
+        self.requests["stt"] += 1
+        form = await request.post()
+        upload = form.get("file")
+        data = upload.file.read() if upload is not None else b""
+        await asyncio.sleep(self.stt_latency + self.stt_seconds_per_mb * len(data) / (1024 * 1024))
+        return web.json_response({"text": self._text(hashlib.sha256(data).hexdigest(), self.words)})
+
+    async def _completions(self, request: web.Request) -> web.Response:
+        self.requests["llm"] += 1
+        payload = await request.json()
+        prompt = "".join(m.get("content", "") for m in payload.get("messages", []))
+        await asyncio.sleep(self.llm_latency)
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        rng = random.Random(seed)
+        content = _CONSPECT.format(
+            title="Конспект лекции",
+            w0=rng.choice(_WORDS), w1=rng.choice(_WORDS), w2=rng.choice(_WORDS), w3=rng.choice(_WORDS),
+            body=self._text(seed, self.words // 2),
+        )
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage})
@@ -0,0 +1,72 @@
+import os
+import random
+from typing import List
+
+from PIL import Image, ImageDraw, ImageFilter
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+
+# A4 at 300 dpi, roughly what a phone photo of a notebook page is
+PAGE_SIZE = (2480, 3508)
+
+STRUCTURED_TEXT = """# Термодинамика: первое начало
+
+## Определения
+
+- Внутренняя энергия $U$ — функция состояния системы.
+- Работа газа $A = \\int_{V_1}^{V_2} p\\,dV$.
+
+## Первое начало
+
+$$Q = \\Delta U + A$$
+
+1. Изохорный процесс: $A = 0$, значит $Q = \\Delta U$.
+2. Изотермический процесс: $\\Delta U = 0$, значит $Q = A = \\nu R T \\ln \\frac{V_2}{V_1}$.
+
+## Пример
+
+Газ массой $m$ нагревают при $p = \\text{const}$. Тогда $Q = \\nu C_p \\Delta T$.
+"""
+
+
+def make_audio(path: str, seconds: float, seed: int = 0) -> str:
+    """Lecture-like audio: tone "phrases" separated by short pauses, unique per seed."""
+    rng = random.Random(seed)
+    audio = AudioSegment.silent(duration=0, frame_rate=16000)
+    while len(audio) < seconds * 1000:
+        phrase_ms = rng.randint(2000, 8000)
+        freq = 180 + rng.randint(0, 220) + seed % 17
+        audio += Sine(freq, sample_rate=16000).to_audio_segment(duration=phrase_ms, volume=-18)
+        audio += AudioSegment.silent(duration=rng.randint(300, 1200), frame_rate=16000)
+    audio = audio[: int(seconds * 1000)].set_channels(1)
+    audio.export(path, format=os.path.splitext(path)[1].lstrip(".") or "wav")
+    return path
+
+
+def make_scan_page(path: str, seed: int = 0) -> str:
+    """A photo-like notebook page: off-white paper, handwriting-ish strokes, slight blur."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", PAGE_SIZE, (236 + rng.randint(0, 10), 232, 220))
+    draw = ImageDraw.Draw(image)
+    for y in range(200, PAGE_SIZE[1] - 200, 90):
+        draw.line([(120, y), (PAGE_SIZE[0] - 120, y)], fill=(170, 190, 215), width=3)
+        x = 160
+        while x < PAGE_SIZE[0] - 300 and rng.random() > 0.03:
+            w = rng.randint(30, 160)
+            draw.line([(x, y - rng.randint(10, 50)), (x + w, y - rng.randint(5, 45))], fill=(30, 40, 90), width=5)
+            x += w + rng.randint(20, 60)
+    image = image.filter(ImageFilter.GaussianBlur(1.2))
+    image.save(path, "JPEG", quality=90)
+    return path
+
+
+def make_scan_pages(directory: str, count: int, seed: int = 0) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    return [make_scan_page(os.path.join(directory, f"page_{seed}_{i}.jpg"), seed * 1000 + i) for i in range(count)]
+
+
+def make_document(path: str, size: int, seed: int = 0) -> str:
+    with open(path, "wb") as f:
+        f.write(random.Random(seed).randbytes(size))
+    return path
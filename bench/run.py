@@ -0,0 +1,215 @@
+"""Offline benchmark: drives the bot's pipelines against local NextCloud and VseGPT stand-ins.
+
+Run from the repository root:
+
+    python -m bench.run --scenarios lecture,scan_pdf,structured_pdf --iterations 10 --concurrency 2
+    python -m bench.run --json bench.json                 # save results
+    python -m bench.run --compare bench.json             # show the change against saved results
+
+ffmpeg is needed for the lecture scenario and wkhtmltopdf for full-quality structured PDFs,
+exactly as for the bot itself.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from bench.fake_nextcloud import FakeNextCloud
+from bench.fake_vsegpt import FakeVseGPT
+
+
+logger = logging.getLogger("bench")
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _serve(app: web.Application) -> Tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def _configure_env(work_dir: str, nextcloud_url: str, user: str, vsegpt_url: str) -> None:
+    # Must happen before any bot module (and config) is imported
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": os.environ.get("TELEGRAM_BOT_TOKEN", "0:bench"),
+        "NEXTCLOUD_URL": nextcloud_url,
+        "NEXTCLOUD_USERNAME": user,
+        "NEXTCLOUD_PASSWORD": "bench",
+        "VSEGPT_BASE_URL": vsegpt_url,
+        "VSEGPT_API_KEY": "bench",
+        "TEMP_DIR": os.path.join(work_dir, "tmp"),
+        "SPOOL_DIR": os.path.join(work_dir, "spool"),
+        "RESULT_CACHE_DIR": os.path.join(work_dir, "result_cache"),
+        "METRICS_PORT": "0",
+    })
+    os.makedirs(os.environ["TEMP_DIR"], exist_ok=True)
+
+
+def _git_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def _run_scenario(name: str, scenario, ctx, iterations: int, concurrency: int) -> Dict[str, Any]:
+    payloads = [await scenario.prepare(ctx, i) for i in range(iterations)]
+    latencies: List[float] = []
+    errors: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(payload: Dict[str, Any]) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await scenario.run(ctx, payload)
+            except Exception as e:
+                errors.append(str(e) or e.__class__.__name__)
+                logger.warning("%s iteration failed: %s", name, e)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in payloads))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "wall_seconds": wall,
+        "throughput_per_min": 60 * iterations / wall if wall else 0.0,
+        "p50": _percentile(latencies, 0.5),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+def _delta(current: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ""
+    return f" ({(current - baseline) / baseline * 100:+.0f}%)"
+
+
+def _print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    base_scenarios = (baseline or {}).get("scenarios", {})
+    print(f"\nversion {results['version']}" + (f" vs {baseline.get('version')}" if baseline else ""))
+    print(f"{'scenario':<16}{'n':>5}{'err':>5}{'per min':>18}{'p50 s':>18}{'p95 s':>18}{'p99 s':>18}")
+    for name, r in results["scenarios"].items():
+        b = base_scenarios.get(name, {})
+        print(
+            f"{name:<16}{r['iterations']:>5}{r['errors']:>5}"
+            f"{r['throughput_per_min']:>10.1f}{_delta(r['throughput_per_min'], b.get('throughput_per_min')):>8}"
+            f"{r['p50']:>10.3f}{_delta(r['p50'], b.get('p50')):>8}"
+            f"{r['p95']:>10.3f}{_delta(r['p95'], b.get('p95')):>8}"
+            f"{r['p99']:>10.3f}{_delta(r['p99'], b.get('p99')):>8}"
+        )
+    base_stages = {s["stage"]: s for s in (baseline or {}).get("stages", [])}
+    print(f"\n{'stage':<24}{'n':>6}{'err':>5}{'p50 s':>18}{'p95 s':>18}{'MB':>10}")
+    for s in results["stages"]:
+        b = base_stages.get(s["stage"], {})
+        print(
+            f"{s['stage']:<24}{s['count']:>6}{s['errors']:>5}"
+            f"{s['p50']:>10.3f}{_delta(s['p50'], b.get('p50')):>8}"
+            f"{s['p95']:>10.3f}{_delta(s['p95'], b.get('p95')):>8}"
+            f"{s['bytes'] / (1024 * 1024):>10.1f}"
+        )
+
+
+async def main(args: argparse.Namespace) -> int:
+    work_dir = tempfile.mkdtemp(prefix="mirea-bench-")
+    fake_nextcloud = FakeNextCloud(latency=args.dav_latency)
+    fake_vsegpt = FakeVseGPT(
+        stt_latency=args.stt_latency, stt_seconds_per_mb=args.stt_seconds_per_mb, llm_latency=args.llm_latency
+    )
+    nc_runner, nc_url = await _serve(fake_nextcloud.app())
+    fake_nextcloud.base_url = nc_url
+    gpt_runner, gpt_url = await _serve(fake_vsegpt.app())
+    _configure_env(work_dir, nc_url, fake_nextcloud.user, gpt_url)
+
+    from bench.scenarios import SCENARIOS, BenchContext
+    from bot.utils.metrics import metrics
+    from bot.utils.nextcloud import NextCloudClient
+    from bot.utils.spool import Spool
+    from bot.utils.workers import shutdown_process_pool
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    nextcloud = NextCloudClient()
+    ctx = BenchContext(nextcloud, Spool(), work_dir, args)
+    results: Dict[str, Any] = {"version": _git_version(), "options": vars(args), "scenarios": {}}
+    try:
+        unknown = [n for n in names if n not in SCENARIOS]
+        if unknown:
+            print(f"Unknown scenario(s): {', '.join(unknown)}; available: {', '.join(SCENARIOS)}", file=sys.stderr)
+            return 2
+        await nextcloud.ensure_discipline_folders_exist()
+        for name in names:
+            logger.info("Running %s: %d iterations, concurrency %d", name, args.iterations, args.concurrency)
+            results["scenarios"][name] = await _run_scenario(name, SCENARIOS[name], ctx, args.iterations, args.concurrency)
+    finally:
+        await nextcloud.close()
+        shutdown_process_pool()
+        await gpt_runner.cleanup()
+        await nc_runner.cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results["stages"] = [
+        {"stage": stage, "count": count, "errors": errors, "p50": p50, "p95": p95, "bytes": nbytes}
+        for stage, count, errors, p50, p95, nbytes in metrics.summary()
+    ]
+    results["server_requests"] = {"nextcloud": dict(fake_nextcloud.requests), "vsegpt": dict(fake_vsegpt.requests)}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if any(r["errors"] for r in results["scenarios"].values()) else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="lecture,scan_pdf,structured_pdf")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--dav-latency", type=float, default=0.005, help="seconds added to every NextCloud request")
+    parser.add_argument("--stt-latency", type=float, default=0.5)
+    parser.add_argument("--stt-seconds-per-mb", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--audio-seconds", type=float, default=120)
+    parser.add_argument("--pages", type=int, default=4, help="scan pages per iteration")
+    parser.add_argument("--doc-bytes", type=int, default=2 * 1024 * 1024, help="size of the extra document per lecture")
+    parser.add_argument("--text-repeat", type=int, default=5, help="copies of the sample conspect in structured_pdf")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    logging.basicConfig(level=logging.INFO if arguments.verbose else logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    sys.exit(asyncio.run(main(arguments)))
@@ -0,0 +1,97 @@
+"""Benchmark scenarios.
+
+Imports the bot's modules, so it must only be imported after ``bench.run`` has pointed
+the environment at the local stand-ins.
+"""
+import os
+import shutil
+from typing import Any, Awaitable, Callable, Dict, NamedTuple
+
+from bench import fixtures
+from bot.utils.file_processing import make_pdf_from_images, make_pdf_from_structured_text
+from bot.utils.lecture_pipeline import JobProgress, _run_lecture_pipeline
+from bot.utils.nextcloud import NextCloudClient
+from bot.utils.spool import Spool
+from config import DISCIPLINES
+
+
+class BenchContext(NamedTuple):
+    nextcloud: NextCloudClient
+    spool: Spool
+    work_dir: str
+    options: Any
+
+
+class Scenario(NamedTuple):
+    # prepare() builds the fixtures for one iteration outside the timed region
+    prepare: Callable[[BenchContext, int], Awaitable[Dict[str, Any]]]
+    run: Callable[[BenchContext, Dict[str, Any]], Awaitable[None]]
+
+
+async def _prepare_lecture(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    # The same payload got_topic enqueues, with the session files already in the spool
+    user_id = 100000 + i
+    session_id = ctx.spool.new_session(user_id)
+    session_dir = ctx.spool.session_dir(session_id)
+    audio = fixtures.make_audio(ctx.spool.path(session_id, "lecture.wav"), ctx.options.audio_seconds, seed=i)
+    scans = fixtures.make_scan_pages(os.path.join(session_dir, "scans"), ctx.options.pages, seed=i)
+    doc_path = fixtures.make_document(ctx.spool.path(session_id, "slides.pdf"), ctx.options.doc_bytes, seed=i)
+    return {
+        "user_id": user_id,
+        "topic": f"Бенчмарк {i}",
+        "discipline": DISCIPLINES[i % len(DISCIPLINES)],
+        "lesson_type": "Лекция",
+        "date_str": None,
+        "first_audio_path": audio,
+        "text_notes": [f"Заметка к занятию {i}"],
+        "scan_images": scans,
+        "files": [{"path": doc_path, "name": "slides.pdf", "kind": "file"}],
+        "spool_session": session_id,
+    }
+
+
+async def _run_lecture(ctx: BenchContext, p: Dict[str, Any]) -> None:
+    progress = JobProgress(None, None, None, p["topic"])
+    try:
+        results = await _run_lecture_pipeline(p, progress, ctx.nextcloud, ctx.spool.session_dir(p["spool_session"]))
+    finally:
+        ctx.spool.cleanup(p["spool_session"])
+    failed = [f"{r.label}: {r.error}" for r in results if not r.ok]
+    if failed:
+        raise RuntimeError("; ".join(failed))
+
+
+async def _prepare_scan_pdf(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    directory = os.path.join(ctx.work_dir, f"scan_{i}")
+    return {
+        "dir": directory,
+        "images": fixtures.make_scan_pages(directory, ctx.options.pages, seed=i),
+        "out": os.path.join(directory, "scan.pdf"),
+    }
+
+
+async def _run_scan_pdf(ctx: BenchContext, p: Dict[str, Any]) -> None:
+    try:
+        await make_pdf_from_images(p["images"], p["out"])
+    finally:
+        shutil.rmtree(p["dir"], ignore_errors=True)
+
+
+async def _prepare_structured_pdf(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    directory = os.path.join(ctx.work_dir, f"structured_{i}")
+    os.makedirs(directory, exist_ok=True)
+    return {"dir": directory, "out": os.path.join(directory, "lecture.pdf"), "text": fixtures.STRUCTURED_TEXT * ctx.options.text_repeat}
+
+
+async def _run_structured_pdf(ctx: BenchContext, p: Dict[str, Any]) -> None:
+    try:
+        await make_pdf_from_structured_text(p["text"], p["out"], title="Бенчмарк")
+    finally:
+        shutil.rmtree(p["dir"], ignore_errors=True)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "lecture": Scenario(_prepare_lecture, _run_lecture),
+    "scan_pdf": Scenario(_prepare_scan_pdf, _run_scan_pdf),
+    "structured_pdf": Scenario(_prepare_structured_pdf, _run_structured_pdf),
+}
@@ -0,0 +1,74 @@
+import logging
+import os
+from typing import Dict
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+
+from bot.keyboards.inline import build_browse_keyboard
+from bot.utils.library import LibraryCache, share_link
+from bot.utils.tree_index import IndexEntry, TreeIndex
+from templates.messages import build_browse_message, build_recent_message
+
+
+RECENT_LIMIT = int(os.getenv("RECENT_LIMIT", "10"))
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+router.message.filter(F.chat.type == "private")
+
+
+async def _links(library: LibraryCache) -> Dict[str, str]:
+    # Links are a nicety here; the listing itself comes from the local index
+    try:
+        return await library.get_links()
+    except Exception:
+        logger.warning("Share links unavailable", exc_info=True)
+        return {}
+
+
+async def _render_folder(tree: TreeIndex, library: LibraryCache, folder: IndexEntry):
+    children = await tree.children(folder.path)
+    parent = None
+    if folder.path != tree.root:
+        parent = await tree.get_path(folder.path.rsplit("/", 1)[0])
+    url = share_link(await _links(library), folder.path)
+    text = build_browse_message(folder.path, children, tree.root, url)
+    markup = build_browse_keyboard([c for c in children if c.is_dir], parent.id if parent else None)
+    return text, markup
+
+
+@router.message(Command("recent"))
+async def cmd_recent(message: Message, tree: TreeIndex, library: LibraryCache):
+    entries = await tree.recent(RECENT_LIMIT)
+    links = await _links(library)
+    items = [(e, share_link(links, e.path.rsplit("/", 1)[0])) for e in entries]
+    await message.answer(build_recent_message(items, tree.root), disable_web_page_preview=True)
+
+
+@router.message(Command("browse"))
+async def cmd_browse(message: Message, tree: TreeIndex, library: LibraryCache):
+    folder = await tree.get_path(tree.root)
+    text, markup = await _render_folder(tree, library, folder)
+    await message.answer(text, reply_markup=markup, disable_web_page_preview=True)
+
+
+@router.callback_query(F.data.startswith("browse:"))
+async def on_browse(cb: CallbackQuery, tree: TreeIndex, library: LibraryCache):
+    folder = await tree.get(int(cb.data.split(":", 1)[1]))
+    if folder is None or not folder.is_dir:
+        await cb.answer("Папка больше не существует")
+        folder = await tree.get_path(tree.root)
+    else:
+        await cb.answer()
+    text, markup = await _render_folder(tree, library, folder)
+    try:
+        await cb.message.edit_text(text, reply_markup=markup, disable_web_page_preview=True)
+    except Exception:
+        await cb.message.answer(text, reply_markup=markup, disable_web_page_preview=True)
+
+
+def register_browse_handlers(dp):
+    dp.include_router(router)
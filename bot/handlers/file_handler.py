@@ -1,5 +1,5 @@
+import asyncio
 import os
-import time
 from typing import Optional
 
 from aiogram import Router, F
@@ -7,9 +7,13 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 from bot.handlers.private_handler import UploadStates
+from bot.utils.albums import AlbumCollector
+from bot.utils.fsm_storage import append_to_list
+from bot.utils.nextcloud import NextCloudClient
+from bot.utils.relay import can_relay, relay_to_staging
+from bot.utils.spool import Spool
 from bot.utils.file_processing import (
     download_telegram_file,
-    convert_to_mp3_if_needed,
     ensure_single_audio_policy,
     save_text_note_to_md,
 )
@@ -18,71 +22,88 @@ from bot.utils.file_processing import (
 router = Router()
 
 
+async def _ingest_file(message: Message, state: FSMContext, spool: Spool, nextcloud: NextCloudClient, session_id: str) -> Optional[dict]:
+    """Store one file of the upload session and return its ``files`` entry, or None if it is dropped."""
+    # Documents and photos go straight to NextCloud staging, no temp file
+    if can_relay(message):
+        entry = await relay_to_staging(message, nextcloud, session_id)
+        if entry:
+            return entry
+
+    local_path, original_name = await download_telegram_file(message, spool, session_id)
+    if not local_path:
+        return None
+    await asyncio.to_thread(spool.enforce_quota)
+
+    # Single audio rule in a session: keep only the first audio, delete later ones
+    original_ext = os.path.splitext(local_path)[1].lower()
+    if original_ext in {".mp3", ".m4a", ".wav", ".ogg"}:
+        keep = await ensure_single_audio_policy(state, local_path)
+        if not keep:
+            spool.remove(session_id, local_path)
+            return None
+
+    # Audio is converted for STT by the lecture job; the original is kept for archival upload
+    return {"path": local_path, "name": original_name or os.path.basename(local_path), "kind": "file"}
+
+
+async def _download_scan_page(message: Message, spool: Spool, session_id: str) -> Optional[str]:
+    local_path, _name = await download_telegram_file(message, spool, session_id)
+    return local_path
+
+
 @router.message(UploadStates.uploading_files, F.document)
 @router.message(UploadStates.uploading_files, F.audio)
 @router.message(UploadStates.uploading_files, F.voice)
 @router.message(UploadStates.uploading_files, F.photo)
 @router.message(UploadStates.uploading_scan, F.photo)
 @router.message(UploadStates.uploading_files, F.text)
-async def on_file_or_text(message: Message, state: FSMContext):
+async def on_file_or_text(message: Message, state: FSMContext, spool: Spool, nextcloud: NextCloudClient, albums: AlbumCollector):
     data = await state.get_data()
     discipline: Optional[str] = data.get("discipline")
     if not discipline:
         await message.answer("Сначала выберите дисциплину.")
         return
 
-    # Download
-    local_path, original_name = await download_telegram_file(message)
-    if not local_path:
-        # Save text notes separately
-        if message.text:
-            await save_text_note_to_md(state, message.text)
+    # An album arrives as one update per item; only the first one handles the whole group
+    batch = await albums.collect(message)
+    if batch is None:
         return
 
-    # Single audio rule in a session: keep only the first audio, delete later ones
-    original_ext = os.path.splitext(local_path)[1].lower()
-    if original_ext in {".mp3", ".m4a", ".wav", ".ogg"}:
-        keep = await ensure_single_audio_policy(state, local_path)
-        if not keep:
-            try:
-                os.remove(local_path)
-            except Exception:
-                pass
-            return
+    session_id = await spool.session_for(state, message.from_user.id)
+
+    # Save text notes separately
+    if message.text:
+        await save_text_note_to_md(state, message.text)
+        return
 
     # If in scan state, collect images only
     if await state.get_state() == UploadStates.uploading_scan.state:
-        if message.photo:
-            scan_images = data.get("scan_images", [])
-            scan_images.append(local_path)
-            await state.update_data(scan_images=scan_images)
-            await message.answer("Фото добавлено к скану 📑")
-            return
-        else:
+        photos = [m for m in batch if m.photo]
+        if len(photos) < len(batch):
             await message.answer("В режиме скана принимаются только фотографии.")
+        if not photos:
             return
-
-    # Convert audio to mp3 for STT
-    converted_path = await convert_to_mp3_if_needed(local_path)
-    if original_ext in {".mp3", ".m4a", ".wav", ".ogg"} and converted_path != local_path:
-        # Update first_audio_path to point to mp3 if this was the first audio
-        data = await state.get_data()
-        if data.get("first_audio_path") == local_path:
-            await state.update_data(first_audio_path=converted_path)
-    local_path = converted_path
-
-    # Save text notes into md file
-    if message.text and not message.document and not message.photo and not message.audio and not message.voice:
-        await save_text_note_to_md(state, message.text)
+        paths = await asyncio.gather(*(_download_scan_page(m, spool, session_id) for m in photos))
+        paths = [p for p in paths if p]
+        await asyncio.to_thread(spool.enforce_quota)
+        # One append for the whole album keeps the pages in sending order
+        await append_to_list(state, "scan_images", *paths)
+        if len(paths) == 1:
+            await message.answer("Фото добавлено к скану 📑")
+        elif paths:
+            await message.answer(f"Фото добавлены к скану: {len(paths)} 📑")
         return
 
-    await message.answer("Файл принят ✅")
-
-    # Store file into session 'files'
-    data = await state.get_data()
-    files = data.get("files", [])
-    files.append({"path": local_path, "name": original_name or os.path.basename(local_path), "kind": "file"})
-    await state.update_data(files=files)
+    entries = await asyncio.gather(*(_ingest_file(m, state, spool, nextcloud, session_id) for m in batch))
+    entries = [e for e in entries if e]
+    if not entries:
+        return
+    await append_to_list(state, "files", *entries)
+    if len(entries) == 1:
+        await message.answer("Файл принят ✅")
+    else:
+        await message.answer(f"Файлы приняты: {len(entries)} ✅")
 
 
 def register_file_handlers(dp):
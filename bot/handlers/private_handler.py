@@ -1,3 +1,5 @@
+import asyncio
+
 from aiogram import Router, F
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, CallbackQuery
@@ -11,14 +13,14 @@ from bot.keyboards.inline import (
     build_upload_keyboard,
     build_lesson_type_keyboard,
 )
-from templates.messages import build_library_message, build_upload_intro, build_scan_intro
-from bot.utils.nextcloud import ensure_discipline_folders_exist, get_or_create_public_links
-from bot.utils.nextcloud import create_folder_structure, upload_file_to_nextcloud, upload_file_unique
-from bot.utils.vsegpt import transcribe_audio, structure_text
-from bot.utils.file_processing import make_pdf_from_text, make_pdf_from_images, make_pdf_from_structured_text
-from config import CONSPECTS_FOLDER, ROOT_FOLDER
-import json
-import os
+from templates.messages import build_upload_intro, build_scan_intro, build_job_status, build_stats_message
+from bot.utils.jobs import JobQueue
+from bot.utils.lecture_pipeline import LECTURE_JOB
+from bot.utils.library import LibraryCache
+from bot.utils.metrics import is_admin, metrics
+from bot.utils.nextcloud import NextCloudClient
+from bot.utils.relay import discard_staging
+from bot.utils.spool import Spool
 
 
 class UploadStates(StatesGroup):
@@ -34,18 +36,16 @@ router.message.filter(F.chat.type == "private")
 
 
 @router.message(CommandStart())
-async def start(message: Message, state: FSMContext):
-    await ensure_discipline_folders_exist()
-    links = await get_or_create_public_links()
-    text = build_library_message(links, include_updated_at=True)
+async def start(message: Message, state: FSMContext, library: LibraryCache):
+    text = await library.get_message(include_updated_at=True)
     await message.answer(text, reply_markup=build_private_library_keyboard(), disable_web_page_preview=True)
 
 
 @router.callback_query(F.data == "refresh_library_private")
-async def refresh_private(cb: CallbackQuery):
+async def refresh_private(cb: CallbackQuery, library: LibraryCache):
     await cb.answer("Обновлено")
-    links = await get_or_create_public_links()
-    text = build_library_message(links, include_updated_at=True)
+    library.invalidate()
+    text = await library.get_message(include_updated_at=True)
     try:
         await cb.message.edit_text(text, reply_markup=build_private_library_keyboard(), disable_web_page_preview=True)
     except Exception:
@@ -62,18 +62,27 @@ async def add_file(cb: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "back_to_library")
-async def back_to_library(cb: CallbackQuery, state: FSMContext):
+async def back_to_library(cb: CallbackQuery, state: FSMContext, library: LibraryCache, spool: Spool, nextcloud: NextCloudClient):
     await cb.answer()
+    # Leaving the upload flow drops whatever was collected so far
+    data = await state.get_data()
+    spool.cleanup(data.get("spool_session"))
+    await discard_staging(nextcloud, data.get("spool_session"))
     await state.clear()
-    links = await get_or_create_public_links()
-    text = build_library_message(links, include_updated_at=True)
+    text = await library.get_message(include_updated_at=True)
     await cb.message.answer(text, reply_markup=build_private_library_keyboard(), disable_web_page_preview=True)
 
 
 @router.callback_query(F.data.startswith("choose_discipline:"))
-async def choose_discipline(cb: CallbackQuery, state: FSMContext):
+async def choose_discipline(cb: CallbackQuery, state: FSMContext, spool: Spool, nextcloud: NextCloudClient):
     discipline = cb.data.split(":", 1)[1]
-    await state.update_data(discipline=discipline, files=[], first_audio_path=None, text_notes=[], scan_images=[])
+    data = await state.get_data()
+    spool.cleanup(data.get("spool_session"))
+    await discard_staging(nextcloud, data.get("spool_session"))
+    await state.update_data(
+        discipline=discipline, files=[], first_audio_path=None, text_notes=[], scan_images=[],
+        spool_session=spool.new_session(cb.from_user.id),
+    )
     await state.set_state(UploadStates.uploading_files)
     await cb.message.answer(
         build_upload_intro(discipline),
@@ -129,78 +138,38 @@ async def lesson_selected(cb: CallbackQuery, state: FSMContext):
 
 
 @router.message(UploadStates.entering_topic, F.text)
-async def got_topic(message: Message, state: FSMContext):
+async def got_topic(message: Message, state: FSMContext, jobs: JobQueue, spool: Spool):
     user_topic = message.text.strip()
     data = await state.get_data()
-    discipline = data.get("discipline")
-    lesson_type = data.get("lesson_type")
-    date_str = data.get("session_date_str")
-    base_folder = await create_folder_structure(discipline, date_str, lesson_type)
-    lesson_folder = f"{base_folder}/{lesson_type}"
-
-    # Consolidate collected files
-    first_audio = data.get("first_audio_path")
-    text_notes = data.get("text_notes", [])
-    scan_images = data.get("scan_images", [])
-    files = data.get("files", [])
-
-    # Save notes to md
-    md_name = "заметка.md"
-    md_content = "\n\n".join(text_notes) if text_notes else ""
-    if md_content:
-        local_md = f"/tmp/note_{message.from_user.id}.md"
-        with open(local_md, "w", encoding="utf-8") as f:
-            f.write(f"# Заметка\n\n{md_content}\n")
-        await upload_file_to_nextcloud(local_md, f"{lesson_folder}/{md_name}")
-
-    # Transcribe audio if present
-    structured_text = None
-    if first_audio and os.path.exists(first_audio):
-        raw_text = await transcribe_audio(first_audio, language="ru")
-        # Load system prompt
-        from pathlib import Path
-        prompt_path = Path("templates/processing_prompt.json")
-        system_prompt = json.loads(prompt_path.read_text(encoding="utf-8"))['system_prompt']
-        structured_text = await structure_text(system_prompt, raw_text)
-        # Make PDF
-        audio_pdf_local = f"/tmp/{message.from_user.id}_lecture.pdf"
-        title = user_topic
-        await make_pdf_from_structured_text(structured_text, audio_pdf_local, title=title)
-        # Upload to lesson folder with unique name rule handled at nextcloud layer if needed
-        safe_topic = user_topic.replace(' ', '_')
-        pdf_name = f"{safe_topic}.pdf"
-        await upload_file_unique(audio_pdf_local, lesson_folder, pdf_name)
-        # Also copy to conspects folder with date prefix
-        conspects_path = f"{discipline}/{CONSPECTS_FOLDER}"
-        date_prefix = datetime.now().strftime('%d_%m_%Y')
-        conspect_name = f"{date_prefix}_{safe_topic}.pdf"
-        await upload_file_unique(audio_pdf_local, f"{ROOT_FOLDER}/{conspects_path}", conspect_name)
-
-    # Build scan PDF if images collected
-    if scan_images:
-        scan_pdf_local = f"/tmp/{message.from_user.id}_scan.pdf"
-        await make_pdf_from_images(scan_images, scan_pdf_local)
-        safe_topic = user_topic.replace(' ', '_')
-        scan_name = f"ФОТО_{safe_topic}.pdf"
-        await upload_file_unique(scan_pdf_local, lesson_folder, scan_name)
-        date_prefix = datetime.now().strftime('%d_%m_%Y')
-        conspect_scan_name = f"ФОТО_{date_prefix}_{safe_topic}.pdf"
-        await upload_file_unique(scan_pdf_local, f"{ROOT_FOLDER}/{discipline}/{CONSPECTS_FOLDER}", conspect_scan_name)
-
-    # Upload all other files as-is
-    for f in files:
-        path = f.get('path')
-        name = f.get('name')
-        kind = f.get('kind')
-        # Skip the first audio here if already processed, still upload original audio
-        if path and os.path.exists(path):
-            try:
-                await upload_file_unique(path, lesson_folder, name)
-            except Exception:
-                pass
-
+    payload = {
+        "user_id": message.from_user.id,
+        "topic": user_topic,
+        "discipline": data.get("discipline"),
+        "lesson_type": data.get("lesson_type"),
+        "date_str": data.get("session_date_str"),
+        "first_audio_path": data.get("first_audio_path"),
+        "text_notes": data.get("text_notes", []),
+        "scan_images": data.get("scan_images", []),
+        "files": data.get("files", []),
+        "spool_session": data.get("spool_session"),
+    }
+    if payload["spool_session"]:
+        spool.pin(payload["spool_session"])
+    # Heavy work runs in the job workers; the status message is updated as stages finish
+    status = await message.answer(build_job_status(user_topic, []))
+    await jobs.enqueue(LECTURE_JOB, payload, chat_id=message.chat.id, status_message_id=status.message_id)
     await state.clear()
-    await message.answer("✅ Готово! Материалы загружены в NextCloud.")
+
+
+@router.callback_query(F.data.startswith("retry_job:"))
+async def retry_job(cb: CallbackQuery, jobs: JobQueue):
+    job_id = int(cb.data.split(":", 1)[1])
+    if not await jobs.retry(job_id, cb.message.chat.id):
+        await cb.answer("Эта обработка уже перезапущена или завершена", show_alert=True)
+        return
+    # The status message turns back into the progress view once a worker picks the job up
+    await cb.message.edit_reply_markup(reply_markup=None)
+    await cb.answer("🔁 Продолжаю с последнего сохранённого этапа")
 
 
 def register_private_handlers(dp):
@@ -213,5 +182,9 @@ async def cmd_health(message: Message):
 
 
 @router.message(Command("stats"))
-async def cmd_stats(message: Message):
-    await message.answer("ℹ️ Статистика будет добавлена позже")
+async def cmd_stats(message: Message, spool: Spool):
+    if not is_admin(message.from_user.id if message.from_user else None):
+        await message.answer("⛔ Команда доступна только администраторам")
+        return
+    usage = await asyncio.to_thread(spool.usage)
+    await message.answer(build_stats_message(metrics.summary(), usage))
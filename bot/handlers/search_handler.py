@@ -0,0 +1,39 @@
+import logging
+import os
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from bot.utils.library import LibraryCache, file_link
+from bot.utils.search_index import SearchIndex
+from templates.messages import build_search_message
+
+
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "5"))
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+router.message.filter(F.chat.type == "private")
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, search: SearchIndex, library: LibraryCache):
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔎 Использование: /search <i>запрос</i>\n\nНапример: /search первое начало термодинамики")
+        return
+    hits = await search.search(query, SEARCH_RESULTS)
+    links = {}
+    if hits:
+        try:
+            links = await library.get_links()
+        except Exception:
+            logger.warning("Share links unavailable", exc_info=True)
+    items = [(h, file_link(links, h.pdf_path) if h.pdf_path else None) for h in hits]
+    await message.answer(build_search_message(query, items), disable_web_page_preview=True)
+
+
+def register_search_handlers(dp):
+    dp.include_router(router)
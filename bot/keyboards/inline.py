@@ -1,3 +1,5 @@
+from typing import Optional
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import DISCIPLINES
 
@@ -56,3 +58,24 @@ def build_lesson_type_keyboard() -> InlineKeyboardMarkup:
             [InlineKeyboardButton(text="⚗️ Лабораторная работа", callback_data="lesson:Лабораторная работа")],
         ]
     )
+
+
+def build_browse_keyboard(folders, parent_id: Optional[int] = None, limit: int = 40) -> InlineKeyboardMarkup:
+    rows = []
+    buf = []
+    for folder in folders[:limit]:
+        buf.append(InlineKeyboardButton(text=f"📁 {folder.name}", callback_data=f"browse:{folder.id}"))
+        if len(buf) == 2:
+            rows.append(buf)
+            buf = []
+    if buf:
+        rows.append(buf)
+    if parent_id is not None:
+        rows.append([InlineKeyboardButton(text="⬆️ Наверх", callback_data=f"browse:{parent_id}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def build_retry_keyboard(job_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="🔁 Повторить", callback_data=f"retry_job:{job_id}")]]
+    )
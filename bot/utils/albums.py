@@ -0,0 +1,50 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.types import Message
+
+
+# Telegram delivers an album as separate updates a few hundred ms apart
+ALBUM_COLLECT_WINDOW = float(os.getenv("ALBUM_COLLECT_WINDOW", "0.8"))
+
+
+class _Album:
+    __slots__ = ("messages", "touched")
+
+    def __init__(self, message: Message) -> None:
+        self.messages = [message]
+        self.touched = asyncio.Event()
+
+
+class AlbumCollector:
+    """Groups the updates of one media group so the album is handled once, as a whole.
+
+    The first update of an album waits until no new item has arrived for ``window``
+    seconds and gets every collected message, in sending order; the others get None.
+    """
+
+    def __init__(self, window: float = ALBUM_COLLECT_WINDOW) -> None:
+        self._window = window
+        self._albums: Dict[Tuple[int, str], _Album] = {}
+
+    async def collect(self, message: Message) -> Optional[List[Message]]:
+        if not message.media_group_id:
+            return [message]
+        key = (message.chat.id, message.media_group_id)
+        album = self._albums.get(key)
+        if album is not None:
+            album.messages.append(message)
+            album.touched.set()
+            return None
+        album = self._albums[key] = _Album(message)
+        try:
+            while True:
+                album.touched.clear()
+                try:
+                    await asyncio.wait_for(album.touched.wait(), self._window)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            del self._albums[key]
+        return sorted(album.messages, key=lambda m: m.message_id)
@@ -1,42 +1,85 @@
 import os
-import io
+import re
 import asyncio
-import tempfile
-from datetime import datetime
-from typing import Optional, Tuple, List
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Optional, Tuple, List
 
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
-from pydub import AudioSegment
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from PIL import Image
-import pdfkit
 
-from config import TEMP_DIR, MAX_AUDIO_BYTES, ALLOWED_AUDIO_EXT
+from config import ALLOWED_AUDIO_EXT
+from bot.utils.fsm_storage import append_to_list, session_lock
+from bot.utils.metrics import track
+from bot.utils.spool import Spool
+from bot.utils.workers import run_in_process
 
+# pydub, reportlab and Pillow are imported where they are used, so startup does not pay for them
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+    from reportlab.pdfgen.canvas import Canvas
 
-pdfmetrics.registerFont(TTFont('DejaVu', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'))
 
+AUDIO_CONVERT_CONCURRENCY = int(os.getenv("AUDIO_CONVERT_CONCURRENCY", "2"))
+# Speech-to-text only needs a narrowband mono signal; this keeps uploads small
+STT_AUDIO_FORMAT = os.getenv("STT_AUDIO_FORMAT", "mp3")
+STT_AUDIO_BITRATE = os.getenv("STT_AUDIO_BITRATE", "32k")
+STT_AUDIO_SAMPLE_RATE = int(os.getenv("STT_AUDIO_SAMPLE_RATE", "16000"))
 
-async def download_telegram_file(message: Message) -> Tuple[Optional[str], Optional[str]]:
+WKHTMLTOPDF_BIN = os.getenv("WKHTMLTOPDF_BIN", "wkhtmltopdf")
+PDF_RENDER_CONCURRENCY = int(os.getenv("PDF_RENDER_CONCURRENCY", "2"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "120"))
+# Self-contained MathJax 3.2.2 SVG bundle (es5/tex-svg.js), vendored in templates/mathjax
+MATHJAX_PATH = os.getenv("MATHJAX_PATH", "templates/mathjax/tex-svg.js")
+# Opt-in only: rendering with a CDN copy is no longer offline, and --check still reports the missing bundle
+MATHJAX_CDN_URL = os.getenv("MATHJAX_CDN_URL", "")
+MATHJAX_READY_STATUS = "mathjax-ready"
+MATHJAX_MAX_WAIT = float(os.getenv("MATHJAX_MAX_WAIT", "15"))
+
+SCAN_TARGET_DPI = int(os.getenv("SCAN_TARGET_DPI", "150"))
+# color | gray | bw (document-style threshold)
+SCAN_MODE = os.getenv("SCAN_MODE", "color")
+SCAN_JPEG_QUALITY = int(os.getenv("SCAN_JPEG_QUALITY", "70"))
+SCAN_BW_THRESHOLD = int(os.getenv("SCAN_BW_THRESHOLD", "12"))
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "4"))
+
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+PDF_FONT_NAME = "DejaVu"
+# Built into reportlab, needs no font file but has no Cyrillic glyphs
+PDF_FALLBACK_FONT = "Helvetica"
+
+_MATH_RE = re.compile(r"\$|\\\(|\\\[")
+_render_semaphore: Optional[asyncio.Semaphore] = None
+_mathjax_warned = False
+
+logger = logging.getLogger(__name__)
+
+
+_font_lock = threading.Lock()
+_font_name: Optional[str] = None
+
+
+async def download_telegram_file(message: Message, spool: Spool, session_id: str) -> Tuple[Optional[str], Optional[str]]:
     file_id = None
+    unique_id = None
     filename = None
     if message.document:
         file_id = message.document.file_id
+        unique_id = message.document.file_unique_id
         filename = message.document.file_name
     elif message.audio:
         file_id = message.audio.file_id
+        unique_id = message.audio.file_unique_id
         filename = (message.audio.file_name or 'audio.mp3')
     elif message.voice:
         file_id = message.voice.file_id
+        unique_id = message.voice.file_unique_id
         filename = 'voice.ogg'
     elif message.photo:
         photo = message.photo[-1]
         file_id = photo.file_id
+        unique_id = photo.file_unique_id
         filename = f"photo_{photo.file_unique_id}.jpg"
     elif message.text:
         # text note will be saved separately
@@ -47,96 +90,261 @@ async def download_telegram_file(message: Message) -> Tuple[Optional[str], Optio
 
     bot = message.bot
     file = await bot.get_file(file_id)
-    dest = os.path.join(TEMP_DIR, filename)
-    await bot.download_file(file.file_path, destination=dest)
+    # Per-session directory and content-unique name: concurrent users never overwrite each other
+    dest = spool.path(session_id, filename or 'file', unique_id)
+    with track('telegram_download', nbytes=file.file_size or 0):
+        await bot.download_file(file.file_path, destination=dest)
+    spool.add(session_id, dest)
     return dest, filename
 
 
-async def convert_to_mp3_if_needed(path: str) -> str:
+def export_stt_audio(audio: "AudioSegment", dst_path: str) -> str:
+    """Write ``audio`` with the speech-to-text profile (STT_AUDIO_FORMAT, bitrate, mono, sample rate)."""
+    audio = audio.set_channels(1).set_frame_rate(STT_AUDIO_SAMPLE_RATE)
+    codec = 'libopus' if STT_AUDIO_FORMAT == 'ogg' else None
+    audio.export(dst_path, format=STT_AUDIO_FORMAT, bitrate=STT_AUDIO_BITRATE, codec=codec)
+    return dst_path
+
+
+def _export_stt_audio(src_path: str, dst_path: str) -> str:
+    # Runs in the process pool: ffmpeg decode/encode must not block the event loop
+    from pydub import AudioSegment
+
+    return export_stt_audio(AudioSegment.from_file(src_path), dst_path)
+
+
+async def convert_for_stt(path: str) -> str:
+    """Make a mono low-bitrate copy of ``path`` for transcription; the original is left untouched."""
     ext = os.path.splitext(path)[1].lower().lstrip('.')
     if ext not in ALLOWED_AUDIO_EXT:
         return path
-    if ext == 'mp3':
-        return path
-    # Convert to mp3
-    mp3_path = os.path.splitext(path)[0] + '.mp3'
-    audio = AudioSegment.from_file(path)
-    audio.export(mp3_path, format='mp3', bitrate='192k')
-    return mp3_path
+    stt_path = f"{os.path.splitext(path)[0]}_stt.{STT_AUDIO_FORMAT}"
+    with track('audio_convert', nbytes=os.path.getsize(path)):
+        return await run_in_process('audio', AUDIO_CONVERT_CONCURRENCY, _export_stt_audio, path, stt_path)
 
 
 async def ensure_single_audio_policy(state: FSMContext, new_audio_path: str) -> bool:
-    data = await state.get_data()
-    first_audio = data.get('first_audio_path')
-    if first_audio:
-        return False
-    await state.update_data(first_audio_path=new_audio_path)
-    return True
+    async with session_lock(state):
+        data = await state.get_data()
+        first_audio = data.get('first_audio_path')
+        if first_audio:
+            return False
+        await state.update_data(first_audio_path=new_audio_path)
+        return True
 
 
 async def save_text_note_to_md(state: FSMContext, text: str) -> None:
-    data = await state.get_data()
-    notes: List[str] = data.get('text_notes', [])
-    notes.append(text)
-    await state.update_data(text_notes=notes)
+    await append_to_list(state, 'text_notes', text)
+
+
+def pdf_font() -> str:
+    """Register the PDF font on first use; falls back to a built-in font if the TTF is missing."""
+    global _font_name
+    with _font_lock:
+        if _font_name is None:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
 
+            try:
+                pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, PDF_FONT_PATH))
+                _font_name = PDF_FONT_NAME
+            except Exception as e:
+                logger.warning("Cannot load PDF font %s (%s), Cyrillic text will not render", PDF_FONT_PATH, e)
+                _font_name = PDF_FALLBACK_FONT
+        return _font_name
 
-def _draw_markdown_like(canvas_obj: canvas.Canvas, text: str, title: Optional[str] = None):
-    canvas_obj.setFont('DejaVu', 12)
+
+def _draw_markdown_like(canvas_obj: "Canvas", text: str, title: Optional[str] = None):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+
+    font = pdf_font()
+    canvas_obj.setFont(font, 12)
     width, height = A4
     x = 20 * mm
     y = height - 20 * mm
     if title:
-        canvas_obj.setFont('DejaVu', 16)
+        canvas_obj.setFont(font, 16)
         canvas_obj.drawString(x, y, title)
         y -= 10 * mm
-        canvas_obj.setFont('DejaVu', 12)
+        canvas_obj.setFont(font, 12)
     for line in text.splitlines():
         if y < 20 * mm:
             canvas_obj.showPage()
-            canvas_obj.setFont('DejaVu', 12)
+            canvas_obj.setFont(font, 12)
             y = height - 20 * mm
         canvas_obj.drawString(x, y, line)
         y -= 7 * mm
 
 
-async def make_pdf_from_text(text: str, out_path: str, title: Optional[str] = None) -> str:
-    c = canvas.Canvas(out_path, pagesize=A4)
+def _make_pdf_from_text_sync(text: str, out_path: str, title: Optional[str] = None) -> str:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen.canvas import Canvas
+
+    c = Canvas(out_path, pagesize=A4)
     _draw_markdown_like(c, text, title=title)
     c.save()
     return out_path
 
 
+async def make_pdf_from_text(text: str, out_path: str, title: Optional[str] = None) -> str:
+    return await asyncio.to_thread(_make_pdf_from_text_sync, text, out_path, title)
+
+
+def _prepare_scan_page(src_path: str, dst_path: str, dpi: int, mode: str, quality: int) -> Tuple[str, int, int, int, float]:
+    # Runs in the process pool: orient, downscale to A4 at ``dpi``, optionally binarise, recompress
+    from PIL import Image, ImageChops, ImageFilter, ImageOps
+    from reportlab.lib.pagesizes import A4
+
+    started = time.perf_counter()
+    with Image.open(src_path) as original:
+        img = ImageOps.exif_transpose(original)
+        max_px = (int(A4[0] / 72 * dpi), int(A4[1] / 72 * dpi))
+        if img.width > img.height:
+            max_px = (max_px[1], max_px[0])
+        img.thumbnail(max_px, Image.LANCZOS)
+        if mode == 'bw':
+            # Document look: remove uneven lighting by comparing with a blurred background, then threshold ink
+            gray = ImageOps.grayscale(img)
+            background = gray.filter(ImageFilter.GaussianBlur(radius=max(8, dpi // 8)))
+            ink = ImageChops.subtract(background, gray)
+            img = ink.point(lambda p: 0 if p > SCAN_BW_THRESHOLD else 255)
+        elif mode == 'gray':
+            img = ImageOps.grayscale(img)
+        else:
+            img = img.convert('RGB')
+        img.save(dst_path, 'JPEG', quality=quality, optimize=True)
+        width, height = img.size
+    return dst_path, width, height, os.path.getsize(dst_path), time.perf_counter() - started
+
+
+def _draw_scan_page(c: "Canvas", img_path: str, img_width: int, img_height: int) -> None:
+    from reportlab.lib.pagesizes import A4
+
+    page_width, page_height = A4
+    # Fit image to page preserving aspect
+    ratio = min(page_width / img_width, page_height / img_height)
+    draw_width = img_width * ratio
+    draw_height = img_height * ratio
+    x = (page_width - draw_width) / 2
+    y = (page_height - draw_height) / 2
+    c.drawImage(img_path, x, y, draw_width, draw_height)
+    c.showPage()
+
+
 async def make_pdf_from_images(image_paths: List[str], out_path: str) -> str:
-    c = canvas.Canvas(out_path, pagesize=A4)
-    for img_path in image_paths:
-        img = Image.open(img_path)
-        img_width, img_height = img.size
-        page_width, page_height = A4
-        # Fit image to page preserving aspect
-        ratio = min(page_width / img_width, page_height / img_height)
-        draw_width = img_width * ratio
-        draw_height = img_height * ratio
-        x = (page_width - draw_width) / 2
-        y = (page_height - draw_height) / 2
-        c.drawImage(img_path, x, y, draw_width, draw_height)
-        c.showPage()
-    c.save()
+    with track('image_to_pdf'):
+        return await _make_pdf_from_images(image_paths, out_path)
+
+
+async def _make_pdf_from_images(image_paths: List[str], out_path: str) -> str:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen.canvas import Canvas
+
+    started = time.perf_counter()
+    page_paths = [f"{os.path.splitext(path)[0]}_page.jpg" for path in image_paths]
+    pages = [
+        asyncio.ensure_future(run_in_process(
+            'scan', SCAN_CONCURRENCY, _prepare_scan_page,
+            path, page_path, SCAN_TARGET_DPI, SCAN_MODE, SCAN_JPEG_QUALITY,
+        ))
+        for path, page_path in zip(image_paths, page_paths)
+    ]
+    c = Canvas(out_path, pagesize=A4)
+    try:
+        # Pages are encoded in parallel but appended in order as soon as each one is ready
+        for index, page in enumerate(pages):
+            page_path, width, height, size, seconds = await page
+            await asyncio.to_thread(_draw_scan_page, c, page_path, width, height)
+            logger.info("Scan page %d/%d: %dx%d px, %.0f KB, %.2f s", index + 1, len(pages), width, height, size / 1024, seconds)
+    finally:
+        for page in pages:
+            page.cancel()
+        await asyncio.gather(*pages, return_exceptions=True)
+        # The prepared pages are only needed while drawing, whether or not every page made it
+        for page_path in page_paths:
+            try:
+                os.remove(page_path)
+            except FileNotFoundError:
+                pass
+    await asyncio.to_thread(c.save)
+    logger.info(
+        "Scan PDF with %d pages: %.0f KB in %.2f s",
+        len(pages), os.path.getsize(out_path) / 1024, time.perf_counter() - started,
+    )
     return out_path
 
 
+def _mathjax_src() -> Optional[str]:
+    global _mathjax_warned
+    if os.path.exists(MATHJAX_PATH):
+        return f"file://{os.path.abspath(MATHJAX_PATH)}"
+    if not _mathjax_warned:
+        if MATHJAX_CDN_URL:
+            logger.warning("Local MathJax bundle %s not found, loading %s", MATHJAX_PATH, MATHJAX_CDN_URL)
+        else:
+            logger.error("Local MathJax bundle %s not found, formulas are left as TeX source", MATHJAX_PATH)
+        _mathjax_warned = True
+    return MATHJAX_CDN_URL or None
+
+
+async def _run_wkhtmltopdf(html_path: str, out_path: str, wait_for_mathjax: bool) -> bool:
+    global _render_semaphore
+    if _render_semaphore is None:
+        _render_semaphore = asyncio.Semaphore(PDF_RENDER_CONCURRENCY)
+    args = [WKHTMLTOPDF_BIN, '--quiet', '--encoding', 'UTF-8', '--enable-local-file-access', '--no-outline']
+    if wait_for_mathjax:
+        # Wait until MathJax reports typesetting finished instead of a fixed delay
+        args += ['--window-status', MATHJAX_READY_STATUS]
+    args += [html_path, out_path]
+    async with _render_semaphore:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+        except FileNotFoundError:
+            logger.warning("%s is not installed", WKHTMLTOPDF_BIN)
+            return False
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), PDF_RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.warning("wkhtmltopdf timed out after %.0f s", PDF_RENDER_TIMEOUT)
+            return False
+    if proc.returncode != 0 or not os.path.exists(out_path):
+        logger.warning("wkhtmltopdf failed (%s): %s", proc.returncode, stderr.decode(errors='replace')[-500:])
+        return False
+    return True
+
+
 async def make_pdf_from_structured_text(structured_text: str, out_path: str, title: Optional[str] = None) -> str:
     # Build HTML with MathJax support for LaTeX rendering
+    body_html = structured_text.replace('\n', '<br/>')
+    has_math = bool(_MATH_RE.search(structured_text))
+    mathjax_src = _mathjax_src() if has_math else None
+    mathjax_head = ""
+    if mathjax_src:
+        mathjax_head = f"""
+  <script>
+    window.MathJax = {{
+      tex: {{inlineMath: [['$', '$'], ['\\\(', '\\\)']]}},
+      startup: {{
+        pageReady: function () {{
+          return MathJax.startup.defaultPageReady().then(function () {{ window.status = '{MATHJAX_READY_STATUS}'; }});
+        }}
+      }}
+    }};
+    // Never wait forever if the bundle fails to load
+    window.setTimeout(function () {{ window.status = '{MATHJAX_READY_STATUS}'; }}, {int(MATHJAX_MAX_WAIT * 1000)});
+  </script>
+  <script src=\"{mathjax_src}\"></script>"""
     html = f"""
 <!DOCTYPE html>
 <html lang=\"ru\">
 <head>
   <meta charset=\"utf-8\">
-  <title>{title or 'Конспект'}</title>
-  <script>
-    window.MathJax = {{ tex: {{inlineMath: [['$', '$'], ['\\\(', '\\\)']]}} }};
-  </script>
-  <script src=\"https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js\"></script>
+  <title>{title or 'Конспект'}</title>{mathjax_head}
   <style>
     body {{ font-family: DejaVu Sans, Arial, sans-serif; font-size: 14px; line-height: 1.5; }}
     h1, h2, h3 {{ font-weight: 700; }}
@@ -147,20 +355,23 @@ async def make_pdf_from_structured_text(structured_text: str, out_path: str, tit
 <body>
   <div class=\"title\">{title or ''}</div>
   <div>
-    {structured_text.replace('\n', '<br/>')}
+    {body_html}
   </div>
 </body>
 </html>
 """
+    html_path = os.path.splitext(out_path)[0] + '.html'
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(html)
     try:
-        options = {
-            'encoding': 'UTF-8',
-            'enable-local-file-access': None,
-            'javascript-delay': '1200',
-            'no-outline': None,
-        }
-        pdfkit.from_string(html, out_path, options=options)
-        return out_path
-    except Exception:
-        # Fallback to plain PDF
-        return await make_pdf_from_text(structured_text, out_path, title=title)
+        with track('pdf_render'):
+            rendered = await _run_wkhtmltopdf(html_path, out_path, wait_for_mathjax=bool(mathjax_src))
+        if rendered:
+            return out_path
+    finally:
+        try:
+            os.remove(html_path)
+        except OSError:
+            pass
+    # Fallback to plain PDF
+    return await asyncio.to_thread(_make_pdf_from_text_sync, structured_text, out_path, title)
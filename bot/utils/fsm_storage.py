@@ -0,0 +1,232 @@
+import asyncio
+import copy
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Set
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "data/fsm.sqlite3")
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
+# Sessions untouched for this long are considered abandoned and dropped
+FSM_SESSION_TTL = float(os.getenv("FSM_SESSION_TTL", str(7 * 24 * 3600)))
+FSM_CLEANUP_INTERVAL = float(os.getenv("FSM_CLEANUP_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+# One lock per live session; dropped once nobody holds or waits for it
+_session_locks: "weakref.WeakValueDictionary[StorageKey, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm_sessions (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fsm_sessions_updated_idx ON fsm_sessions (updated_at);
+"""
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None, updated_at: float = 0.0) -> None:
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """Durable aiogram FSM storage in a local SQLite file (WAL mode).
+
+    Reads are served from memory; changes are batched and flushed every
+    ``flush_interval`` seconds as one row per session (state + compact JSON data).
+    Because of that cache the file belongs to one process: a second process opening
+    the same path refuses to start.
+    """
+
+    def __init__(self, path: str = FSM_DB_PATH, flush_interval: float = FSM_FLUSH_INTERVAL, ttl: float = FSM_SESSION_TTL) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._owner_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._owner_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._owner_fd)
+            raise RuntimeError(f"{path} is used by another bot process; give each process its own FSM_DB_PATH") from None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._ttl = ttl
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        # Flushes never overlap, so an older snapshot of a session cannot land after a newer one
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_cleanup = 0.0
+        self._closed = False
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _load_sync(self, k: str) -> _Record:
+        with self._db_lock:
+            row = self._db.execute("SELECT state, data, updated_at FROM fsm_sessions WHERE key = ?", (k,)).fetchone()
+        if row is None:
+            return _Record()
+        return _Record(row[0], json.loads(row[1]), row[2])
+
+    async def _record(self, key: StorageKey) -> _Record:
+        k = self._key(key)
+        record = self._records.get(k)
+        if record is None:
+            loaded = await asyncio.to_thread(self._load_sync, k)
+            # Another coroutine may have loaded or changed it while we were in the thread
+            record = self._records.setdefault(k, loaded)
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record) -> None:
+        record.updated_at = time.time()
+        self._dirty.add(self._key(key))
+        if self._flush_task is None and not self._closed:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self._flush_interval)
+        finally:
+            self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("FSM storage flush failed")
+
+    def _write_sync(self, upserts: List[tuple], deletes: List[tuple]) -> None:
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                if upserts:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO fsm_sessions (key, state, data, updated_at) VALUES (?, ?, ?, ?)", upserts
+                    )
+                if deletes:
+                    self._db.executemany("DELETE FROM fsm_sessions WHERE key = ?", deletes)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            upserts: List[tuple] = []
+            deletes: List[tuple] = []
+            for k in dirty:
+                record = self._records.get(k)
+                if record is None or (record.state is None and not record.data):
+                    # Cleared sessions take no space at all
+                    deletes.append((k,))
+                else:
+                    data = json.dumps(record.data, ensure_ascii=False, separators=(",", ":"))
+                    upserts.append((k, record.state, data, record.updated_at))
+            if upserts or deletes:
+                try:
+                    await asyncio.to_thread(self._write_sync, upserts, deletes)
+                except Exception:
+                    self._dirty |= dirty
+                    raise
+            # Forget cleared sessions only once the delete is on disk, and only if nothing changed them meanwhile
+            for (k,) in deletes:
+                record = self._records.get(k)
+                if record is not None and k not in self._dirty and record.state is None and not record.data:
+                    del self._records[k]
+        if time.time() - self._last_cleanup >= FSM_CLEANUP_INTERVAL:
+            await self.cleanup_expired()
+
+    def _cleanup_sync(self, cutoff: float) -> int:
+        with self._db_lock:
+            return self._db.execute("DELETE FROM fsm_sessions WHERE updated_at < ?", (cutoff,)).rowcount
+
+    async def cleanup_expired(self) -> int:
+        self._last_cleanup = time.time()
+        cutoff = self._last_cleanup - self._ttl
+        for k in [k for k, r in self._records.items() if r.updated_at < cutoff and k not in self._dirty]:
+            del self._records[k]
+        removed = await asyncio.to_thread(self._cleanup_sync, cutoff)
+        if removed:
+            logger.info("Dropped %d abandoned FSM session(s)", removed)
+        return removed
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._record(key)
+        # Deep copies both ways: a handler mutating a nested list in place must not change the
+        # cached session behind _touch()'s back
+        record.data = copy.deepcopy(data)
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._record(key)).data)
+
+    async def append_data(self, key: StorageKey, field: str, *items: Any) -> List[Any]:
+        """Append to a list in the session data without rewriting the rest of it."""
+        record = await self._record(key)
+        values = list(record.data.get(field) or [])
+        values.extend(copy.deepcopy(items))
+        record.data[field] = values
+        self._touch(key, record)
+        return copy.deepcopy(values)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        with self._db_lock:
+            self._db.close()
+        os.close(self._owner_fd)
+
+
+def session_lock(state: FSMContext) -> asyncio.Lock:
+    """Serialises read-modify-write updates of one user's session across concurrent updates."""
+    lock = _session_locks.get(state.key)
+    if lock is None:
+        lock = _session_locks[state.key] = asyncio.Lock()
+    return lock
+
+
+async def append_to_list(state: FSMContext, field: str, *items: Any) -> List[Any]:
+    """Append items to a list field of the FSM data, natively when the storage supports it."""
+    if isinstance(state.storage, SQLiteStorage):
+        return await state.storage.append_data(state.key, field, *items)
+    async with session_lock(state):
+        data = await state.get_data()
+        values = list(data.get(field) or [])
+        values.extend(items)
+        await state.update_data({field: values})
+        return values
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from bot.utils.metrics import track
+
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "data/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+# A running job's lease is renewed while its worker is alive; once it lapses, any process may take the job over
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# A job whose process keeps dying under it (e.g. OOM while rendering) is given up after this many claims
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    chat_id INTEGER,
+    status_message_id INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS job_stages (
+    job_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    artifact TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, stage)
+);
+"""
+
+STAGE_DONE = "done"
+STAGE_FAILED = "failed"
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    chat_id: Optional[int]
+    status_message_id: Optional[int]
+    attempts: int
+
+
+class StageRecord(NamedTuple):
+    status: str
+    artifact: Optional[str]
+    error: Optional[str]
+
+
+class JobStages:
+    """Checkpoints of one job's stages. A rerun of the job skips every stage that is already done
+    and picks up its saved artifact (a text, a local file path or a JSON document) instead."""
+
+    def __init__(self, queue: Optional["JobQueue"], job_id: int, records: Optional[Dict[str, StageRecord]] = None) -> None:
+        # Without a queue the checkpoints only live in memory (benchmarks, one-off runs)
+        self._queue = queue
+        self._job_id = job_id
+        self._records = dict(records or {})
+        self._failures: List[Tuple[str, str]] = []
+
+    def artifact(self, stage: str) -> Optional[str]:
+        record = self._records.get(stage)
+        if record is None or record.status != STAGE_DONE:
+            return None
+        return record.artifact
+
+    def completed(self) -> List[str]:
+        return [stage for stage, r in self._records.items() if r.status == STAGE_DONE]
+
+    def failures(self) -> List[Tuple[str, str]]:
+        """Stages that failed during this run."""
+        return list(self._failures)
+
+    def partial(self, stage: str) -> Optional[str]:
+        record = self._records.get(stage)
+        return record.artifact if record is not None else None
+
+    async def _save(self, stage: str, record: StageRecord) -> None:
+        self._records[stage] = record
+        if self._queue is not None:
+            await self._queue.save_stage(self._job_id, stage, record)
+
+    async def done(self, stage: str, artifact: str = "") -> None:
+        await self._save(stage, StageRecord(STAGE_DONE, artifact, None))
+
+    async def failed(self, stage: str, error: str, artifact: Optional[str] = None) -> None:
+        """``artifact`` keeps partial progress, e.g. the uploads that did succeed."""
+        self._failures.append((stage, error))
+        await self._save(stage, StageRecord(STAGE_FAILED, artifact, error))
+
+
+class JobQueue:
+    """Local persistent job queue in a SQLite file; no external broker.
+
+    Jobs are ``queued`` -> ``running`` -> ``done``/``failed``. The file belongs to the single
+    bot process; a job is claimed by one atomic UPDATE that stamps the claiming queue as its
+    owner with a lease of ``lease_seconds``. A job whose lease lapsed (the bot crashed or was
+    restarted) is claimed again, and a failed job can be retried; either way handlers resume
+    from the stages checkpointed in ``job_stages``.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, lease_seconds: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        orphaned = self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)", (time.time(),)
+        ).fetchone()[0]
+        if orphaned:
+            logger.info("Resuming %d interrupted job(s)", orphaned)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], chat_id: Optional[int] = None, status_message_id: Optional[int] = None) -> int:
+        now = time.time()
+        cur = await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO jobs (kind, payload, chat_id, status_message_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, json.dumps(payload, ensure_ascii=False), chat_id, status_message_id, now, now),
+        )
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def _claim_sync(self) -> Optional[Job]:
+        now = time.time()
+        abandoned = self._execute(
+            "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? "
+            "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?) AND attempts >= ? RETURNING id",
+            (f"interrupted {self.max_attempts} times", now, now, self.max_attempts),
+        ).fetchall()
+        for (job_id,) in abandoned:
+            logger.error("Job %d was interrupted %d times, giving up", job_id, self.max_attempts)
+        # One statement, so two workers can never claim the same job
+        row = self._execute(
+            "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' "
+            "OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)) ORDER BY id LIMIT 1) "
+            "RETURNING id, kind, payload, chat_id, status_message_id, attempts",
+            (self.owner, now + self.lease_seconds, now, now),
+        ).fetchone()
+        if row is None:
+            return None
+        return Job(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5])
+
+    async def claim(self) -> Optional[Job]:
+        return await asyncio.to_thread(self._claim_sync)
+
+    async def wait_for_work(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def renew(self, job_id: int) -> bool:
+        """Extend the lease of a job this queue owns; False if it was taken over after the lease lapsed."""
+        now = time.time()
+        cur = await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (now + self.lease_seconds, now, job_id, self.owner),
+        )
+        return bool(cur.rowcount)
+
+    async def finish(self, job_id: int, error: Optional[str] = None) -> None:
+        status = "failed" if error else "done"
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND owner = ?",
+            (status, error, time.time(), job_id, self.owner),
+        )
+
+    async def retry(self, job_id: int, chat_id: int) -> bool:
+        """Put a failed job back in the queue; it resumes from its last completed stage."""
+        cur = await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = 'queued', error = NULL, updated_at = ? WHERE id = ? AND chat_id = ? AND status = 'failed'",
+            (time.time(), job_id, chat_id),
+        )
+        if cur.rowcount:
+            self._wakeup.set()
+        return bool(cur.rowcount)
+
+    def _load_stages_sync(self, job_id: int) -> Dict[str, StageRecord]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT stage, status, artifact, error FROM job_stages WHERE job_id = ? ORDER BY updated_at", (job_id,)
+            ).fetchall()
+        return {row[0]: StageRecord(*row[1:]) for row in rows}
+
+    async def stages(self, job_id: int) -> JobStages:
+        return JobStages(self, job_id, await asyncio.to_thread(self._load_stages_sync, job_id))
+
+    async def save_stage(self, job_id: int, stage: str, record: StageRecord) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO job_stages (job_id, stage, status, artifact, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, stage, record.status, record.artifact, record.error, time.time()),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            # Jobs interrupted by a clean shutdown can be taken over at once instead of after the lease
+            self._db.execute("UPDATE jobs SET lease_until = 0 WHERE owner = ? AND status = 'running'", (self.owner,))
+            self._db.close()
+
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class JobWorkerPool:
+    """Fixed number of asyncio workers draining a JobQueue."""
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, JobHandler], size: int = JOB_WORKERS) -> None:
+        self._queue = queue
+        self._handlers = handlers
+        self._size = size
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        for i in range(self._size):
+            self._tasks.append(asyncio.create_task(self._worker(i), name=f"job-worker-{i}"))
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.claim()
+            if job is None:
+                await self._queue.wait_for_work(JOB_POLL_INTERVAL)
+                continue
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                await self._queue.finish(job.id, error=f"unknown job kind {job.kind!r}")
+                continue
+            logger.info("Worker %d running job %d (%s, attempt %d)", index, job.id, job.kind, job.attempts)
+            run = asyncio.create_task(handler(job))
+            lease = asyncio.create_task(self._keep_lease(job.id, run))
+            try:
+                with track(f"job.{job.kind}"):
+                    await run
+            except asyncio.CancelledError:
+                if lease.done() and not lease.cancelled() and lease.result():
+                    # Someone else owns the job now; finishing it here would only race that one
+                    continue
+                # Left as 'running' on purpose: it is taken over once its lease lapses
+                raise
+            except Exception as e:
+                logger.exception("Job %d failed", job.id)
+                await self._queue.finish(job.id, error=str(e) or e.__class__.__name__)
+            else:
+                await self._queue.finish(job.id)
+            finally:
+                lease.cancel()
+
+    async def _keep_lease(self, job_id: int, run: asyncio.Task) -> bool:
+        """Renew the job's lease while it runs; if the job was taken over, stop the handler."""
+        while True:
+            await asyncio.sleep(self._queue.lease_seconds / 3)
+            try:
+                if not await self._queue.renew(job_id):
+                    logger.warning("Lost the lease of job %d, stopping it", job_id)
+                    run.cancel()
+                    return True
+            except Exception:
+                logger.warning("Could not renew the lease of job %d", job_id, exc_info=True)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from aiogram import Bot
+
+from templates.messages import build_job_error, build_job_resumed, build_job_status, build_upload_report
+from bot.keyboards.inline import build_retry_keyboard
+from bot.utils.jobs import Job, JobQueue, JobStages
+from bot.utils.nextcloud import NextCloudClient
+from bot.utils.relay import discard_staging
+from bot.utils.search_index import LectureDocument, SearchIndex, lecture_key
+from bot.utils.spool import Spool
+from bot.utils.uploads import UploadResult, UploadStage
+from bot.utils.transcription import transcribe_lecture_audio
+from bot.utils.structuring import structure_lecture_text
+from bot.utils.file_processing import convert_for_stt, make_pdf_from_images, make_pdf_from_structured_text
+from bot.utils.result_cache import get_result_cache, make_key, sha256_file, sha256_text
+from config import CONSPECTS_FOLDER, ROOT_FOLDER, VSEGPT_STT_MODEL, VSEGPT_CHAT_MODEL
+
+
+LECTURE_JOB = "lecture"
+
+# Checkpointed stages, in pipeline order; each saves its artifact once it is done
+FOLDER = "folder"
+CONVERT = "convert"
+TRANSCRIBE = "transcribe"
+STRUCTURE = "structure"
+RENDER = "render"
+RENDER_SCAN = "render_scan"
+UPLOAD = "upload"
+# Upload checkpoint key of the lecture PDF in the lesson folder (the search index links to it)
+LECTURE_PDF_KEY = "lecture_pdf"
+
+logger = logging.getLogger(__name__)
+
+
+class JobProgress:
+    """Keeps the user's "processing" message in sync with finished stages."""
+
+    def __init__(self, bot: Bot, chat_id: Optional[int], message_id: Optional[int], topic: str) -> None:
+        self._bot = bot
+        self._chat_id = chat_id
+        self._message_id = message_id
+        self._topic = topic
+        self._steps: List[str] = []
+        self._lock = asyncio.Lock()
+
+    async def _edit(self, text: str, reply_markup=None) -> None:
+        if not self._chat_id or not self._message_id:
+            return
+        try:
+            await self._bot.edit_message_text(
+                text=text, chat_id=self._chat_id, message_id=self._message_id, reply_markup=reply_markup
+            )
+        except Exception:
+            logger.debug("Could not update status message %s", self._message_id, exc_info=True)
+
+    async def step(self, line: str) -> None:
+        async with self._lock:
+            self._steps.append(line)
+            await self._edit(build_job_status(self._topic, self._steps))
+
+    async def finish(self, text: str, reply_markup=None) -> None:
+        async with self._lock:
+            await self._edit(text, reply_markup)
+
+
+class IncompleteUpload(Exception):
+    """Some materials were not produced or uploaded; the job is failed so that it can be retried."""
+
+
+@asynccontextmanager
+async def _stage(stages: JobStages, name: str):
+    try:
+        yield
+    except Exception as e:
+        await stages.failed(name, str(e) or e.__class__.__name__)
+        raise
+
+
+async def _convert(stages: JobStages, audio_path: str) -> str:
+    stt_audio = stages.artifact(CONVERT)
+    if stt_audio and os.path.exists(stt_audio):
+        return stt_audio
+    async with _stage(stages, CONVERT):
+        stt_audio = await convert_for_stt(audio_path)
+    await stages.done(CONVERT, stt_audio)
+    return stt_audio
+
+
+async def _transcribe(stages: JobStages, audio_path: str, language: str) -> str:
+    raw_text = stages.artifact(TRANSCRIBE)
+    if raw_text is not None:
+        return raw_text
+    # Keyed by the original recording, so a resubmission skips conversion as well as STT
+    cache = get_result_cache()
+    key = make_key("stt", await sha256_file(audio_path), VSEGPT_STT_MODEL, language)
+    raw_text = await cache.get(key)
+    if raw_text is not None:
+        logger.info("Transcript cache hit for %s", audio_path)
+    else:
+        stt_audio = await _convert(stages, audio_path)
+        async with _stage(stages, TRANSCRIBE):
+            raw_text = await transcribe_lecture_audio(stt_audio, language=language)
+        await cache.set(key, raw_text)
+        if stt_audio != audio_path and os.path.exists(stt_audio):
+            os.remove(stt_audio)
+    await stages.done(TRANSCRIBE, raw_text)
+    return raw_text
+
+
+async def _structure(stages: JobStages, prompts: dict, raw_text: str) -> str:
+    structured_text = stages.artifact(STRUCTURE)
+    if structured_text is not None:
+        return structured_text
+    cache = get_result_cache()
+    prompt_hash = sha256_text(json.dumps(prompts, sort_keys=True, ensure_ascii=False))
+    key = make_key("structure", prompt_hash, sha256_text(raw_text), VSEGPT_CHAT_MODEL)
+    structured_text = await cache.get(key)
+    if structured_text is not None:
+        logger.info("Structured text cache hit")
+    else:
+        async with _stage(stages, STRUCTURE):
+            structured_text = await structure_lecture_text(prompts, raw_text)
+        await cache.set(key, structured_text)
+    await stages.done(STRUCTURE, structured_text)
+    return structured_text
+
+
+async def _render(stages: JobStages, name: str, out_path: str, make: Callable[[], Awaitable[None]]) -> None:
+    if stages.artifact(name) == out_path and os.path.exists(out_path):
+        return
+    async with _stage(stages, name):
+        await make()
+    await stages.done(name, out_path)
+
+
+async def process_lecture_job(
+    job: Job, bot: Bot, nextcloud: NextCloudClient, spool: Spool, jobs: JobQueue, search: Optional[SearchIndex] = None,
+) -> None:
+    p = job.payload
+    progress = JobProgress(bot, job.chat_id, job.status_message_id, p["topic"])
+    session_id = p.get("spool_session") or spool.new_session(p["user_id"])
+    stages = await jobs.stages(job.id)
+    if stages.completed():
+        await progress.step(build_job_resumed(stages.completed()))
+    # Pinned again on a retry; the inputs and artifacts in the session are needed until the job is done
+    spool.pin(session_id)
+    try:
+        results = await _run_lecture_pipeline(p, progress, nextcloud, spool.session_dir(session_id), stages, search)
+    except Exception as e:
+        spool.unpin(session_id)
+        await progress.finish(build_job_error(e, stages.failures()), build_retry_keyboard(job.id))
+        raise
+    failed = [r for r in results if not r.ok]
+    if not failed:
+        await progress.finish(build_upload_report(results))
+        spool.cleanup(session_id)
+        if any(f.get("remote") for f in p.get("files") or []):
+            await discard_staging(nextcloud, session_id)
+        return
+    # Keep the inputs and finished stages around until the spool evicts them, so the retry can pick up
+    spool.unpin(session_id)
+    await progress.finish(build_upload_report(results, retry=True), build_retry_keyboard(job.id))
+    raise IncompleteUpload(", ".join(r.label for r in failed))
+
+
+async def _run_lecture_pipeline(
+    p: dict, progress: JobProgress, nextcloud: NextCloudClient, work_dir: str,
+    stages: Optional[JobStages] = None, search: Optional[SearchIndex] = None,
+) -> List[UploadResult]:
+    """convert -> transcribe -> structure -> render -> upload; stages already done in ``stages`` are skipped."""
+    os.makedirs(work_dir, exist_ok=True)
+    stages = stages or JobStages(None, 0)
+    user_topic = p["topic"]
+    discipline = p["discipline"]
+    lesson_type = p["lesson_type"]
+    first_audio = p.get("first_audio_path")
+    text_notes = p.get("text_notes") or []
+    scan_images = p.get("scan_images") or []
+    files = p.get("files") or []
+
+    # The folder and the date prefix are saved too, so a retry on another day uploads to the same place
+    folder = stages.artifact(FOLDER)
+    if folder is None:
+        async with _stage(stages, FOLDER):
+            base_folder = await nextcloud.create_folder_structure(discipline, p.get("date_str"), lesson_type)
+        folder = json.dumps({"base_folder": base_folder, "date_prefix": datetime.now().strftime('%d_%m_%Y')})
+        await stages.done(FOLDER, folder)
+    folder = json.loads(folder)
+    base_folder = folder["base_folder"]
+    date_prefix = folder["date_prefix"]
+    lesson_folder = f"{base_folder}/{lesson_type}"
+    await progress.step("📁 Папка занятия готова")
+
+    safe_topic = user_topic.replace(' ', '_')
+    conspects_folder = f"{ROOT_FOLDER}/{discipline}/{CONSPECTS_FOLDER}"
+    lecture_pdf_name = f"{safe_topic}.pdf"
+    texts = {}
+
+    async with nextcloud.upload_batch():
+        uploads = UploadStage(nextcloud, done=json.loads(stages.partial(UPLOAD) or "{}"))
+
+        # Save notes to md
+        md_name = "заметка.md"
+        md_content = "\n\n".join(text_notes) if text_notes else ""
+        if md_content:
+            local_md = os.path.join(work_dir, "note.md")
+            with open(local_md, "w", encoding="utf-8") as f:
+                f.write(f"# Заметка\n\n{md_content}\n")
+            uploads.add(local_md, lesson_folder, md_name, unique=False, key="note")
+
+        # Upload all other files as-is; they do not depend on processing.
+        # Checkpointed by position in the job payload: user file names may repeat or match the generated ones
+        for i, f in enumerate(files):
+            path = f.get('path')
+            name = f.get('name')
+            if f.get('remote'):
+                uploads.add_move(f['remote'], lesson_folder, name, key=f"file:{i}")
+            elif path and os.path.exists(path):
+                uploads.add(path, lesson_folder, name, key=f"file:{i}")
+
+        async def lecture_chain():
+            # STT -> LLM -> PDF, then both copies of the conspect
+            raw_text = await _transcribe(stages, first_audio, "ru")
+            texts["transcript"] = raw_text
+            await progress.step("🎙 Аудио распознано")
+            prompt_path = Path("templates/processing_prompt.json")
+            prompts = json.loads(prompt_path.read_text(encoding="utf-8"))
+            structured_text = await _structure(stages, prompts, raw_text)
+            texts["conspect"] = structured_text
+            await progress.step("🧠 Конспект структурирован")
+            audio_pdf_local = os.path.join(work_dir, "lecture.pdf")
+            await _render(stages, RENDER, audio_pdf_local, lambda: make_pdf_from_structured_text(structured_text, audio_pdf_local, title=user_topic))
+            await progress.step("📄 PDF конспекта собран")
+            uploads.add_with_copy(audio_pdf_local, lesson_folder, lecture_pdf_name, conspects_folder, f"{date_prefix}_{safe_topic}.pdf", key=LECTURE_PDF_KEY)
+
+        async def scan_chain():
+            scan_pdf_local = os.path.join(work_dir, "scan.pdf")
+            await _render(stages, RENDER_SCAN, scan_pdf_local, lambda: make_pdf_from_images(scan_images, scan_pdf_local))
+            await progress.step("📑 PDF скана собран")
+            uploads.add_with_copy(scan_pdf_local, lesson_folder, f"ФОТО_{safe_topic}.pdf", conspects_folder, f"ФОТО_{date_prefix}_{safe_topic}.pdf", key="scan_pdf")
+
+        chains = {}
+        if first_audio and (os.path.exists(first_audio) or stages.artifact(TRANSCRIBE) is not None):
+            chains["Конспект по аудио"] = lecture_chain()
+        elif first_audio:
+            uploads.fail("Конспект по аудио", FileNotFoundError("аудиозапись больше недоступна, загрузите её заново"))
+        if scan_images:
+            chains["Скан конспекта"] = scan_chain()
+        outcomes = await asyncio.gather(*chains.values(), return_exceptions=True)
+        for label, outcome in zip(chains, outcomes):
+            if isinstance(outcome, Exception):
+                uploads.fail(label, outcome)
+
+        results = await uploads.wait()
+
+    uploaded = json.dumps({r.key: r.remote_path for r in results if r.ok and r.key}, ensure_ascii=False)
+    failed = [r.label for r in results if not r.ok]
+    if failed:
+        await stages.failed(UPLOAD, ", ".join(failed), uploaded)
+    else:
+        await stages.done(UPLOAD, uploaded)
+
+    if search is not None and texts:
+        # Indexed in the background; the texts are kept even if rendering or upload failed
+        pdf_path = next((r.remote_path for r in results if r.ok and r.key == LECTURE_PDF_KEY), None)
+        search.add(LectureDocument(
+            key=lecture_key(lesson_folder, user_topic),
+            discipline=discipline,
+            date_str=os.path.basename(base_folder),
+            lesson_type=lesson_type,
+            topic=user_topic,
+            pdf_path=pdf_path,
+            transcript=texts.get("transcript", ""),
+            conspect=texts.get("conspect", ""),
+        ))
+
+    return results
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from templates.messages import build_library_message
+from bot.utils.nextcloud import NextCloudClient
+from config import ROOT_FOLDER
+
+
+LIBRARY_CACHE_TTL = float(os.getenv("LIBRARY_CACHE_TTL", "600"))
+
+
+def share_link(links: Dict[str, str], folder_path: str) -> Optional[str]:
+    """Public link to a folder under ``ROOT_FOLDER/<discipline>`` through that discipline's share."""
+    root = ROOT_FOLDER.strip("/").split("/")
+    parts = folder_path.strip("/").split("/")
+    if parts[:len(root)] != root or len(parts) <= len(root):
+        return None
+    url = links.get(parts[len(root)])
+    rest = "/".join(parts[len(root) + 1:])
+    if not url or not rest:
+        return url
+    if "?dir=" in url:
+        # Fallback links open the Files app instead of a public share
+        return url + quote("/" + rest, safe="/")
+    return f"{url}?path={quote('/' + rest, safe='')}"
+
+
+def file_link(links: Dict[str, str], file_path: str) -> Optional[str]:
+    """Public link that opens the file itself, e.g. the uploaded lecture PDF."""
+    folder, name = file_path.rstrip("/").rsplit("/", 1)
+    url = share_link(links, folder)
+    if not url:
+        return None
+    if "?dir=" in url:
+        return f"{url}&scrollto={quote(name, safe='')}"
+    # Public shares serve a single file through the download endpoint
+    share, _, query = url.partition("?")
+    return f"{share}/download?{query + '&' if query else 'path=%2F&'}files={quote(name, safe='')}"
+
+
+class LibraryCache:
+    """In-process TTL cache for the discipline share links and the rendered library text.
+
+    Concurrent callers that hit an expired entry share a single NextCloud fetch.
+    """
+
+    def __init__(self, nextcloud: NextCloudClient, ttl: float = LIBRARY_CACHE_TTL) -> None:
+        self._nextcloud = nextcloud
+        self._ttl = ttl
+        self._links: Optional[Dict[str, str]] = None
+        self._updated_at: Optional[datetime] = None
+        self._expires_at: float = 0.0
+        self._messages: Dict[bool, str] = {}
+        self._inflight: Optional[asyncio.Future] = None
+
+    def invalidate(self) -> None:
+        self._links = None
+        self._messages = {}
+        self._expires_at = 0.0
+
+    async def _load(self) -> Dict[str, str]:
+        await self._nextcloud.ensure_discipline_folders_exist()
+        links = await self._nextcloud.get_or_create_public_links()
+        self._links = links
+        self._updated_at = datetime.now()
+        self._expires_at = time.monotonic() + self._ttl
+        self._messages = {}
+        return links
+
+    def _clear_inflight(self, fut: asyncio.Future) -> None:
+        if self._inflight is fut:
+            self._inflight = None
+
+    async def get_links(self) -> Dict[str, str]:
+        if self._links is not None and time.monotonic() < self._expires_at:
+            return self._links
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+            self._inflight.add_done_callback(self._clear_inflight)
+        # Shield so one cancelled caller does not abort the fetch for everybody else
+        return await asyncio.shield(self._inflight)
+
+    async def get_message(self, include_updated_at: bool = False) -> str:
+        links = await self.get_links()
+        text = self._messages.get(include_updated_at)
+        if text is None:
+            text = build_library_message(links, include_updated_at=include_updated_at, updated_at=self._updated_at)
+            self._messages[include_updated_at] = text
+        return text
@@ -0,0 +1,159 @@
+import contextlib
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# 0 disables the Prometheus endpoint
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Percentiles for /stats are computed over the most recent observations
+RECENT_SAMPLES = 1024
+
+logger = logging.getLogger(__name__)
+
+
+class _Stage:
+    __slots__ = ("count", "errors", "bytes", "total_seconds", "buckets", "recent")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total_seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.recent: Deque[float] = deque(maxlen=RECENT_SAMPLES)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Metrics:
+    """Per-stage latency histograms, counts, errors and bytes, exported in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._stages: Dict[str, _Stage] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False, nbytes: int = 0) -> None:
+        s = self._stages.get(stage)
+        if s is None:
+            s = self._stages[stage] = _Stage()
+        s.count += 1
+        s.total_seconds += seconds
+        s.bytes += nbytes
+        if error:
+            s.errors += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                s.buckets[i] += 1
+        s.recent.append(seconds)
+
+    @contextlib.contextmanager
+    def track(self, stage: str, nbytes: int = 0) -> Iterator[None]:
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, error=error, nbytes=nbytes)
+
+    def summary(self) -> List[Tuple[str, int, int, float, float, int]]:
+        """(stage, count, errors, p50, p95, bytes) for every stage seen so far."""
+        rows = []
+        for name in sorted(self._stages):
+            s = self._stages[name]
+            recent = sorted(s.recent)
+            rows.append((name, s.count, s.errors, _percentile(recent, 0.5), _percentile(recent, 0.95), s.bytes))
+        return rows
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP mirea_bot_stage_duration_seconds Pipeline stage latency.",
+            "# TYPE mirea_bot_stage_duration_seconds histogram",
+        ]
+        for name in sorted(self._stages):
+            s = self._stages[name]
+            for bound, value in zip(BUCKETS, s.buckets):
+                lines.append(f'mirea_bot_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {value}')
+            lines.append(f'mirea_bot_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {s.count}')
+            lines.append(f'mirea_bot_stage_duration_seconds_sum{{stage="{name}"}} {s.total_seconds:.6f}')
+            lines.append(f'mirea_bot_stage_duration_seconds_count{{stage="{name}"}} {s.count}')
+        lines += ["# HELP mirea_bot_stage_errors_total Failed stage runs.", "# TYPE mirea_bot_stage_errors_total counter"]
+        lines += [f'mirea_bot_stage_errors_total{{stage="{n}"}} {s.errors}' for n, s in sorted(self._stages.items())]
+        lines += ["# HELP mirea_bot_stage_bytes_total Bytes processed per stage.", "# TYPE mirea_bot_stage_bytes_total counter"]
+        lines += [f'mirea_bot_stage_bytes_total{{stage="{n}"}} {s.bytes}' for n, s in sorted(self._stages.items())]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def track(stage: str, nbytes: int = 0):
+    return metrics.track(stage, nbytes=nbytes)
+
+
+def client_trace_config(prefix: str) -> aiohttp.TraceConfig:
+    """Record every request of an aiohttp session as ``<prefix>.<VERB>`` (``<prefix>.OCS`` for OCS API calls)."""
+
+    async def on_start(_session, ctx, params) -> None:
+        ctx.started = time.perf_counter()
+        ctx.nbytes = int(params.headers.get("Content-Length") or 0)
+
+    def _stage(params) -> str:
+        return f"{prefix}.OCS" if "/ocs/" in params.url.path else f"{prefix}.{params.method}"
+
+    async def on_end(_session, ctx, params) -> None:
+        status = params.response.status
+        # 404 on HEAD/PROPFIND and 405 on MKCOL are normal answers, not failures
+        error = status >= 400 and status not in (404, 405)
+        metrics.observe(_stage(params), time.perf_counter() - ctx.started, error=error, nbytes=ctx.nbytes)
+
+    async def on_exception(_session, ctx, params) -> None:
+        metrics.observe(_stage(params), time.perf_counter() - ctx.started, error=True, nbytes=ctx.nbytes)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_start)
+    trace_config.on_request_end.append(on_end)
+    trace_config.on_request_exception.append(on_exception)
+    return trace_config
+
+
+def is_admin(user_id: Optional[int]) -> bool:
+    return user_id is not None and user_id in ADMIN_IDS
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    if not port:
+        return None
+
+    async def handle(_request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        await runner.cleanup()
+        raise RuntimeError(
+            f"Metrics port {host}:{port} is unavailable ({e.strerror}); give each bot process its own METRICS_PORT or set it to 0"
+        ) from None
+    logger.info("Prometheus metrics on http://%s:%d/metrics", host, port)
+    return runner
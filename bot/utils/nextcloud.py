@@ -1,13 +1,19 @@
 import asyncio
 import base64
+import contextlib
 import hashlib
+import logging
 import os
+import xml.etree.ElementTree as ET
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Set
 
+import aiofiles
 import aiohttp
-from urllib.parse import quote
+from urllib.parse import quote, unquote, urlparse
 
+from bot.utils.metrics import client_trace_config
 from config import (
     NEXTCLOUD_URL,
     NEXTCLOUD_USERNAME,
@@ -17,6 +23,34 @@ from config import (
     CONSPECTS_FOLDER,
 )
 
+if TYPE_CHECKING:
+    from bot.utils.tree_index import TreeIndex
+
+
+NEXTCLOUD_POOL_LIMIT = int(os.getenv("NEXTCLOUD_POOL_LIMIT", "32"))
+NEXTCLOUD_POOL_LIMIT_PER_HOST = int(os.getenv("NEXTCLOUD_POOL_LIMIT_PER_HOST", "8"))
+NEXTCLOUD_KEEPALIVE_TIMEOUT = float(os.getenv("NEXTCLOUD_KEEPALIVE_TIMEOUT", "60"))
+NEXTCLOUD_READ_TIMEOUT = float(os.getenv("NEXTCLOUD_READ_TIMEOUT", "300"))
+# Files at or above this size go through the chunked upload protocol
+NEXTCLOUD_CHUNKED_THRESHOLD = int(os.getenv("NEXTCLOUD_CHUNKED_THRESHOLD", str(64 * 1024 * 1024)))
+NEXTCLOUD_CHUNK_SIZE = int(os.getenv("NEXTCLOUD_CHUNK_SIZE", str(16 * 1024 * 1024)))
+NEXTCLOUD_STREAM_BUFFER = int(os.getenv("NEXTCLOUD_STREAM_BUFFER", str(256 * 1024)))
+# Give up on a unique name after this many candidates turned out to be taken on the server
+UNIQUE_NAME_ATTEMPTS = 20
+
+DAV_NS = "{DAV:}"
+PROPFIND_BODY = (
+    '<?xml version="1.0"?>'
+    '<d:propfind xmlns:d="DAV:"><d:prop>'
+    "<d:resourcetype/><d:getcontentlength/><d:getetag/><d:getlastmodified/>"
+    "</d:prop></d:propfind>"
+)
+
+logger = logging.getLogger(__name__)
+
+# Folder listings shared by every upload inside one ``upload_batch()`` block
+_batch_listings: ContextVar[Optional[Dict[str, "asyncio.Future[Set[str]]"]]] = ContextVar("_batch_listings", default=None)
+
 
 def _b64(s: str) -> str:
     return base64.urlsafe_b64encode(s.encode()).decode().rstrip("=")
@@ -40,86 +74,367 @@ def _dav_url(path: str) -> str:
     return f"{NEXTCLOUD_URL}/remote.php/dav/files/{NEXTCLOUD_USERNAME}/{quote(path.strip('/'), safe='/')}"
 
 
-async def _mkcol(session: aiohttp.ClientSession, path: str) -> None:
-    url = _dav_url(path)
-    async with session.request("MKCOL", url, auth=aiohttp.BasicAuth(NEXTCLOUD_USERNAME, NEXTCLOUD_PASSWORD)) as resp:
-        if resp.status in (201, 405):
-            return
-        if resp.status == 409:
+def _uploads_url(upload_id: str, chunk: Optional[str] = None) -> str:
+    url = f"{NEXTCLOUD_URL}/remote.php/dav/uploads/{NEXTCLOUD_USERNAME}/{upload_id}"
+    return f"{url}/{chunk}" if chunk else url
+
+
+def _chunk_name(index: int) -> str:
+    # Chunk names are sorted lexically by the server; v2 numbering runs from 1 to 10000
+    return f"{index:05d}"
+
+
+def _upload_id(local_path: str, remote_path: str) -> str:
+    # Stable across restarts for the same file and target, so an interrupted upload resumes
+    st = os.stat(local_path)
+    key = f"{remote_path}|{st.st_size}|{int(st.st_mtime)}"
+    return "mirea-bot-" + hashlib.sha1(key.encode()).hexdigest()
+
+
+async def _file_sender(local_path: str, offset: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+    async with aiofiles.open(local_path, "rb") as f:
+        await f.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = NEXTCLOUD_STREAM_BUFFER if remaining is None else min(NEXTCLOUD_STREAM_BUFFER, remaining)
+            chunk = await f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _parse_multistatus(body: str) -> List[Dict[str, object]]:
+    entries: List[Dict[str, object]] = []
+    root = ET.fromstring(body)
+    for response in root.iter(f"{DAV_NS}response"):
+        href = unquote(urlparse(response.findtext(f"{DAV_NS}href", "")).path)
+        prop = response.find(f"{DAV_NS}propstat/{DAV_NS}prop")
+        if prop is None:
+            continue
+        resourcetype = prop.find(f"{DAV_NS}resourcetype")
+        length = prop.findtext(f"{DAV_NS}getcontentlength")
+        entries.append({
+            "href": href,
+            "name": os.path.basename(href.rstrip("/")),
+            "is_dir": resourcetype is not None and resourcetype.find(f"{DAV_NS}collection") is not None,
+            "size": int(length) if length else 0,
+            "etag": (prop.findtext(f"{DAV_NS}getetag") or "").strip('"'),
+            "last_modified": prop.findtext(f"{DAV_NS}getlastmodified") or "",
+        })
+    return entries
+
+
+class NameTaken(RuntimeError):
+    """The target of a no-overwrite PUT, MOVE or COPY already exists (412)."""
+
+
+class NextCloudClient:
+    """Long-lived WebDAV/OCS client sharing one keep-alive connection pool.
+
+    Create it once at startup, pass it to the handlers and ``close()`` it on shutdown.
+    With a ``TreeIndex`` attached, every successful change is mirrored into it and
+    name/existence checks are answered from it while its listings are fresh.
+    """
+
+    def __init__(
+        self,
+        limit: int = NEXTCLOUD_POOL_LIMIT,
+        limit_per_host: int = NEXTCLOUD_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = NEXTCLOUD_KEEPALIVE_TIMEOUT,
+        index: Optional["TreeIndex"] = None,
+    ) -> None:
+        self.index = index
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._auth = aiohttp.BasicAuth(NEXTCLOUD_USERNAME, NEXTCLOUD_PASSWORD)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            # No total timeout: large uploads legitimately take longer than aiohttp's 5 minute default
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=NEXTCLOUD_READ_TIMEOUT)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                auth=self._auth,
+                timeout=timeout,
+                trace_configs=[client_trace_config("nextcloud")],
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _record(self, method: str, *args) -> None:
+        # The index is a cache: failing to update it must never fail the upload itself
+        if self.index is None:
             return
-        body = await resp.text()
-        raise RuntimeError(f"MKCOL {path} failed: {resp.status} {body}")
+        try:
+            await getattr(self.index, method)(*args)
+        except Exception:
+            logger.warning("Tree index %s%r failed", method, args, exc_info=True)
+
+    async def mkcol(self, path: str) -> None:
+        async with self.session.request("MKCOL", _dav_url(path)) as resp:
+            if resp.status in (201, 405):
+                await self._record("record_dir", path, resp.status == 201)
+                return
+            if resp.status == 409:
+                return
+            body = await resp.text()
+            raise RuntimeError(f"MKCOL {path} failed: {resp.status} {body}")
 
+    async def put(self, path: str, data: bytes) -> None:
+        async with self.session.put(_dav_url(path), data=data) as resp:
+            if resp.status not in (200, 201, 204):
+                body = await resp.text()
+                raise RuntimeError(f"PUT {path} failed: {resp.status} {body}")
+            etag = resp.headers.get("ETag", "").strip('"') or None
+        await self._record("record_file", path, len(data), etag)
 
-async def _put(session: aiohttp.ClientSession, path: str, data: bytes) -> None:
-    url = _dav_url(path)
-    async with session.put(url, data=data, auth=aiohttp.BasicAuth(NEXTCLOUD_USERNAME, NEXTCLOUD_PASSWORD)) as resp:
-        if resp.status not in (200, 201, 204):
+    async def put_stream(self, remote_path: str, stream: AsyncIterator[bytes], size: Optional[int] = None) -> None:
+        headers = {"Content-Length": str(size)} if size is not None else None
+        async with self.session.put(_dav_url(remote_path), data=stream, headers=headers) as resp:
+            if resp.status not in (200, 201, 204):
+                body = await resp.text()
+                raise RuntimeError(f"PUT {remote_path} failed: {resp.status} {body}")
+            etag = resp.headers.get("ETag", "").strip('"') or None
+        await self._record("record_file", remote_path, size or 0, etag)
+
+    async def move(self, src_path: str, dst_path: str) -> None:
+        headers = {"Destination": _dav_url(dst_path), "Overwrite": "F"}
+        async with self.session.request("MOVE", _dav_url(src_path), headers=headers) as resp:
+            if resp.status == 412:
+                raise NameTaken(dst_path)
+            if resp.status not in (201, 204):
+                body = await resp.text()
+                raise RuntimeError(f"MOVE {src_path} -> {dst_path} failed: {resp.status} {body}")
+        await self._record("record_copy", src_path, dst_path, True)
+
+    async def delete(self, path: str) -> None:
+        async with self.session.delete(_dav_url(path)) as resp:
+            if resp.status not in (200, 204, 404):
+                body = await resp.text()
+                raise RuntimeError(f"DELETE {path} failed: {resp.status} {body}")
+        await self._record("record_remove", path)
+
+    async def copy(self, src_path: str, dst_path: str) -> None:
+        # Server-side copy: the bytes are not sent again
+        headers = {"Destination": _dav_url(dst_path), "Overwrite": "F"}
+        async with self.session.request("COPY", _dav_url(src_path), headers=headers) as resp:
+            if resp.status == 412:
+                raise NameTaken(dst_path)
+            if resp.status not in (201, 204):
+                body = await resp.text()
+                raise RuntimeError(f"COPY {src_path} -> {dst_path} failed: {resp.status} {body}")
+        await self._record("record_copy", src_path, dst_path)
+
+    async def propfind(self, url: str, depth: int = 1) -> Optional[List[Dict[str, object]]]:
+        """Return the multistatus entries for ``url`` (itself first), or None if it does not exist."""
+        headers = {"Depth": str(depth), "Content-Type": "application/xml"}
+        async with self.session.request("PROPFIND", url, data=PROPFIND_BODY, headers=headers) as resp:
+            if resp.status == 404:
+                return None
             body = await resp.text()
-            raise RuntimeError(f"PUT {path} failed: {resp.status} {body}")
+            if resp.status != 207:
+                raise RuntimeError(f"PROPFIND {url} failed: {resp.status} {body}")
+            return _parse_multistatus(body)
 
+    async def put_file(self, local_path: str, remote_path: str, overwrite: bool = True) -> None:
+        """Stream ``local_path`` to ``remote_path`` without loading it into memory.
 
-async def _exists(session: aiohttp.ClientSession, path: str) -> bool:
-    url = _dav_url(path)
-    async with session.head(url, auth=aiohttp.BasicAuth(NEXTCLOUD_USERNAME, NEXTCLOUD_PASSWORD)) as resp:
-        return resp.status in (200, 204)
+        With ``overwrite=False`` an existing file is left alone and NameTaken is raised.
+        """
+        size = os.path.getsize(local_path)
+        if size >= NEXTCLOUD_CHUNKED_THRESHOLD:
+            await self._chunked_upload(local_path, remote_path, size, overwrite)
+            return
+        headers = {"Content-Length": str(size)}
+        if not overwrite:
+            headers["If-None-Match"] = "*"
+        # With a precondition, wait for 100 Continue so a 412 does not cost the whole body
+        async with self.session.put(
+            _dav_url(remote_path), data=_file_sender(local_path), headers=headers, expect100=not overwrite,
+        ) as resp:
+            if resp.status == 412:
+                # The body was never sent, so this connection cannot be reused
+                resp.close()
+                raise NameTaken(remote_path)
+            if resp.status not in (200, 201, 204):
+                body = await resp.text()
+                raise RuntimeError(f"PUT {remote_path} failed: {resp.status} {body}")
+            etag = resp.headers.get("ETag", "").strip('"') or None
+        await self._record("record_file", remote_path, size, etag)
 
+    async def _chunked_upload(self, local_path: str, remote_path: str, size: int, overwrite: bool = True) -> None:
+        # NextCloud chunked upload v2: MKCOL an upload dir, PUT numbered chunks, MOVE .file to assemble
+        upload_id = _upload_id(local_path, remote_path)
+        destination = _dav_url(remote_path)
+        headers = {"Destination": destination, "OC-Total-Length": str(size)}
 
-async def ensure_discipline_folders_exist() -> None:
-    async with aiohttp.ClientSession() as session:
-        await _mkcol(session, ROOT_FOLDER)
+        uploaded: Dict[str, int] = {}
+        entries = await self.propfind(_uploads_url(upload_id))
+        if entries is None:
+            async with self.session.request("MKCOL", _uploads_url(upload_id), headers=headers) as resp:
+                if resp.status not in (201, 405):
+                    body = await resp.text()
+                    raise RuntimeError(f"MKCOL upload {upload_id} failed: {resp.status} {body}")
+        else:
+            uploaded = {e["name"]: e["size"] for e in entries[1:] if not e["is_dir"]}
+
+        total_chunks = (size + NEXTCLOUD_CHUNK_SIZE - 1) // NEXTCLOUD_CHUNK_SIZE
+        for index in range(total_chunks):
+            offset = index * NEXTCLOUD_CHUNK_SIZE
+            length = min(NEXTCLOUD_CHUNK_SIZE, size - offset)
+            name = _chunk_name(index + 1)
+            if uploaded.get(name) == length:
+                continue
+            chunk_headers = dict(headers, **{"Content-Length": str(length)})
+            url = _uploads_url(upload_id, name)
+            async with self.session.put(url, data=_file_sender(local_path, offset, length), headers=chunk_headers) as resp:
+                if resp.status not in (200, 201, 204):
+                    body = await resp.text()
+                    raise RuntimeError(f"PUT chunk {name} of {remote_path} failed: {resp.status} {body}")
+        if uploaded:
+            logger.info("Resumed chunked upload of %s: %d of %d chunks already on server", remote_path, len(uploaded), total_chunks)
+
+        move_headers = dict(headers, Overwrite="T" if overwrite else "F")
+        async with self.session.request("MOVE", _uploads_url(upload_id, ".file"), headers=move_headers) as resp:
+            if resp.status == 412:
+                # The chunks were staged for this exact target; the next name starts a new upload
+                await self._discard_upload(upload_id)
+                raise NameTaken(remote_path)
+            if resp.status not in (201, 204):
+                body = await resp.text()
+                raise RuntimeError(f"MOVE assembly of {remote_path} failed: {resp.status} {body}")
+            etag = resp.headers.get("ETag", "").strip('"') or None
+        await self._record("record_file", remote_path, size, etag)
+
+    async def _discard_upload(self, upload_id: str) -> None:
+        try:
+            async with self.session.delete(_uploads_url(upload_id)):
+                pass
+        except aiohttp.ClientError:
+            logger.warning("Could not remove upload %s", upload_id, exc_info=True)
+
+    async def ensure_discipline_folders_exist(self) -> None:
+        await self.mkcol(ROOT_FOLDER)
         for d in DISCIPLINES:
             base = f"{ROOT_FOLDER}/{d}"
-            await _mkcol(session, base)
-            await _mkcol(session, f"{base}/{CONSPECTS_FOLDER}")
-
+            await self.mkcol(base)
+            await self.mkcol(f"{base}/{CONSPECTS_FOLDER}")
 
-async def create_folder_structure(discipline: str, date_str: Optional[str] = None, lesson_type: Optional[str] = None) -> str:
-    if not date_str:
-        date_str = today_str()
-    async with aiohttp.ClientSession() as session:
+    async def create_folder_structure(self, discipline: str, date_str: Optional[str] = None, lesson_type: Optional[str] = None) -> str:
+        if not date_str:
+            date_str = today_str()
         base = f"{ROOT_FOLDER}/{discipline}/{date_str}"
-        await _mkcol(session, base)
+        await self.mkcol(base)
         if lesson_type:
-            await _mkcol(session, f"{base}/{lesson_type}")
+            await self.mkcol(f"{base}/{lesson_type}")
         return base
 
+    async def upload_file_to_nextcloud(self, local_path: str, remote_path: str) -> None:
+        await self.put_file(local_path, remote_path)
 
-async def upload_file_to_nextcloud(local_path: str, remote_path: str) -> None:
-    async with aiohttp.ClientSession() as session:
-        with open(local_path, "rb") as f:
-            data = f.read()
-        await _put(session, remote_path, data)
+    async def _place_unique(self, folder_path: str, suggested_name: str, place) -> str:
+        """Run ``place(path)`` (a no-overwrite PUT, MOVE or COPY) under the first free name.
 
+        The name comes from a listing that may be a little old, e.g. from the tree index, and the
+        discipline folders are public shares anyone can upload to. So the server has the final
+        word: a taken name is answered with 412 and the next suffix is tried.
+        """
+        taken: Set[str] = set()
+        for _ in range(UNIQUE_NAME_ATTEMPTS):
+            unique_name = await self.generate_unique_filename(folder_path, suggested_name, taken)
+            path = f"{folder_path}/{unique_name}"
+            try:
+                await place(path)
+            except NameTaken:
+                logger.info("%s appeared on the server since it was listed, trying the next name", path)
+                taken.add(unique_name)
+                await self._record("forget_listing", folder_path)
+                continue
+            return path
+        raise RuntimeError(f"No free name for {suggested_name} in {folder_path} after {UNIQUE_NAME_ATTEMPTS} attempts")
 
-async def upload_file_unique(local_path: str, folder_path: str, suggested_name: str) -> str:
-    async with aiohttp.ClientSession() as session:
-        unique_name = await generate_unique_filename(session, folder_path, suggested_name)
-        with open(local_path, "rb") as f:
-            data = f.read()
-        await _put(session, f"{folder_path}/{unique_name}", data)
-        return f"{folder_path}/{unique_name}"
+    async def upload_file_unique(self, local_path: str, folder_path: str, suggested_name: str) -> str:
+        return await self._place_unique(folder_path, suggested_name, lambda path: self.put_file(local_path, path, overwrite=False))
 
+    @contextlib.asynccontextmanager
+    async def upload_batch(self):
+        """Reuse one PROPFIND listing per folder for all uploads made inside the block."""
+        token = _batch_listings.set({})
+        try:
+            yield
+        finally:
+            _batch_listings.reset(token)
 
-async def generate_unique_filename(session: aiohttp.ClientSession, folder_path: str, base_filename: str) -> str:
-    name, ext = os.path.splitext(base_filename)
-    candidate = base_filename
-    idx = 1
-    while await _exists(session, f"{folder_path}/{candidate}"):
-        candidate = f"{name}_{idx}{ext}"
-        idx += 1
-    return candidate
+    async def list_entries(self, folder_path: str) -> Optional[List[Dict[str, object]]]:
+        """Depth-1 PROPFIND of a folder under the user's files (the folder itself first)."""
+        return await self.propfind(_dav_url(folder_path))
 
+    async def list_folder(self, folder_path: str) -> Set[str]:
+        if self.index is not None:
+            names = await self.index.folder_names(folder_path)
+            if names is not None:
+                return names
+        entries = await self.list_entries(folder_path)
+        if entries is None:
+            return set()
+        await self._record("record_listing", folder_path, entries)
+        # The first entry is the folder itself
+        return {e["name"] for e in entries[1:]}
 
-async def get_or_create_public_links() -> Dict[str, str]:
-    headers = {"OCS-APIRequest": "true"}
-    auth = aiohttp.BasicAuth(NEXTCLOUD_USERNAME, NEXTCLOUD_PASSWORD)
-    async with aiohttp.ClientSession(headers=headers) as session:
+    async def _folder_names(self, folder_path: str) -> Set[str]:
+        listings = _batch_listings.get()
+        if listings is None:
+            return await self.list_folder(folder_path)
+        key = folder_path.strip("/")
+        fut = listings.get(key)
+        if fut is None:
+            fut = listings[key] = asyncio.ensure_future(self.list_folder(folder_path))
+        try:
+            return await fut
+        except Exception:
+            listings.pop(key, None)
+            raise
+
+    async def copy_unique(self, src_path: str, folder_path: str, suggested_name: str) -> str:
+        return await self._place_unique(folder_path, suggested_name, lambda path: self.copy(src_path, path))
+
+    async def move_unique(self, src_path: str, folder_path: str, suggested_name: str) -> str:
+        return await self._place_unique(folder_path, suggested_name, lambda path: self.move(src_path, path))
+
+    async def generate_unique_filename(self, folder_path: str, base_filename: str, taken: Optional[Set[str]] = None) -> str:
+        names = await self._folder_names(folder_path)
+        taken = taken or set()
+        name, ext = os.path.splitext(base_filename)
+        candidate = base_filename
+        idx = 1
+        while candidate in names or candidate in taken:
+            candidate = f"{name}_{idx}{ext}"
+            idx += 1
+        # Claim the name so later uploads in the same batch skip it
+        names.add(candidate)
+        return candidate
+
+    async def get_or_create_public_links(self) -> Dict[str, str]:
+        headers = {"OCS-APIRequest": "true"}
         # List existing shares
         base_api = f"{NEXTCLOUD_URL}/ocs/v2.php/apps/files_sharing/api/v1/shares"
         links: Dict[str, str] = {}
 
-        async with session.get(base_api, params={"format": "json"}, auth=auth) as resp:
+        async with self.session.get(base_api, params={"format": "json"}, headers=headers) as resp:
             data = await resp.json()
             if resp.status == 200 and data.get("ocs", {}).get("data"):
                 for item in data["ocs"]["data"]:
@@ -142,7 +457,7 @@ async def get_or_create_public_links() -> Dict[str, str]:
                 "permissions": 31,  # read+write+create+delete+share
                 "publicUpload": "true",
             }
-            async with session.post(base_api, data=payload, params={"format": "json"}, auth=auth) as resp:
+            async with self.session.post(base_api, data=payload, params={"format": "json"}, headers=headers) as resp:
                 data = await resp.json()
                 if resp.status in (200, 201) and data.get("ocs", {}).get("data", {}).get("url"):
                     links[d] = data["ocs"]["data"]["url"]
@@ -151,3 +466,42 @@ async def get_or_create_public_links() -> Dict[str, str]:
                     links[d] = f"{NEXTCLOUD_URL}/apps/files/?dir=/{ROOT_FOLDER}/{d}"
 
         return links
+
+
+_client: Optional[NextCloudClient] = None
+
+
+def get_client() -> NextCloudClient:
+    global _client
+    if _client is None:
+        _client = NextCloudClient()
+    return _client
+
+
+def set_client(client: NextCloudClient) -> None:
+    global _client
+    _client = client
+
+
+async def ensure_discipline_folders_exist() -> None:
+    await get_client().ensure_discipline_folders_exist()
+
+
+async def create_folder_structure(discipline: str, date_str: Optional[str] = None, lesson_type: Optional[str] = None) -> str:
+    return await get_client().create_folder_structure(discipline, date_str, lesson_type)
+
+
+async def upload_file_to_nextcloud(local_path: str, remote_path: str) -> None:
+    await get_client().upload_file_to_nextcloud(local_path, remote_path)
+
+
+async def upload_file_unique(local_path: str, folder_path: str, suggested_name: str) -> str:
+    return await get_client().upload_file_unique(local_path, folder_path, suggested_name)
+
+
+async def generate_unique_filename(folder_path: str, base_filename: str) -> str:
+    return await get_client().generate_unique_filename(folder_path, base_filename)
+
+
+async def get_or_create_public_links() -> Dict[str, str]:
+    return await get_client().get_or_create_public_links()
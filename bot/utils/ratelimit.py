@@ -0,0 +1,87 @@
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucketLimiter:
+    """Async token bucket with an in-flight cap and adaptive backoff.
+
+    ``rate`` tokens per second refill a bucket of ``burst`` tokens; each request takes one.
+    At most ``max_in_flight`` requests run at a time. ``backoff()`` pauses the bucket after a
+    429/5xx (honouring Retry-After), doubling the pause while failures keep coming.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1, max_in_flight: int = 1,
+                 min_backoff: float = 2.0, max_backoff: float = 60.0) -> None:
+        self.name = name
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._penalty = 0.0
+
+    async def _take_token(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        started = time.monotonic()
+        async with self._in_flight:
+            await self._take_token()
+            waited = time.monotonic() - started
+            if waited >= 0.5:
+                logger.info("%s: waited %.2f s in rate limiter queue", self.name, waited)
+            else:
+                logger.debug("%s: waited %.3f s in rate limiter queue", self.name, waited)
+            yield
+
+    def backoff(self, retry_after: Optional[float] = None) -> None:
+        self._penalty = min(self._max_backoff, max(self._min_backoff, self._penalty * 2))
+        delay = retry_after if retry_after is not None else self._penalty
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        self._tokens = 0.0
+        logger.warning("%s: backing off for %.1f s", self.name, delay)
+
+    def success(self) -> None:
+        self._penalty = self._penalty / 2 if self._penalty > self._min_backoff else 0.0
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+from aiogram.types import Message
+
+from bot.utils.metrics import track
+from bot.utils.nextcloud import NextCloudClient
+from config import ALLOWED_AUDIO_EXT
+
+
+RELAY_CHUNK_SIZE = int(os.getenv("RELAY_CHUNK_SIZE", str(256 * 1024)))
+# Read-ahead between the Telegram download and the WebDAV upload, in chunks
+RELAY_BUFFER_CHUNKS = int(os.getenv("RELAY_BUFFER_CHUNKS", "8"))
+RELAY_TIMEOUT = int(os.getenv("RELAY_TIMEOUT", "300"))
+# Top-level folder of the bot's NextCloud account, outside the publicly shared library tree
+RELAY_STAGING_ROOT = os.getenv("RELAY_STAGING_ROOT", ".bot-staging")
+# Staged files of sessions that were never confirmed are removed after this long
+RELAY_STAGING_TTL = float(os.getenv("RELAY_STAGING_TTL", str(7 * 24 * 3600)))
+RELAY_SWEEP_INTERVAL = float(os.getenv("RELAY_SWEEP_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+_EOF = object()
+
+
+def staging_folder(session_id: str) -> str:
+    return f"{RELAY_STAGING_ROOT}/{session_id}"
+
+
+def can_relay(message: Message) -> bool:
+    """Files that need no local processing can skip the disk entirely."""
+    if message.photo:
+        return True
+    if message.document:
+        ext = os.path.splitext(message.document.file_name or "")[1].lower().lstrip(".")
+        return ext not in ALLOWED_AUDIO_EXT
+    return False
+
+
+async def _buffered(source: AsyncIterator[bytes], max_chunks: int) -> AsyncIterator[bytes]:
+    # Let the download run a few chunks ahead of the upload without ever holding the whole file
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_chunks)
+
+    async def pump() -> None:
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_EOF)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _EOF:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
+
+async def relay_to_staging(message: Message, nextcloud: NextCloudClient, session_id: str) -> Optional[dict]:
+    """Pipe a Telegram file straight into the session's NextCloud staging folder.
+
+    Returns the session ``files`` entry, or None if the caller should fall back to downloading.
+    """
+    if message.photo:
+        item = message.photo[-1]
+        filename = f"photo_{item.file_unique_id}.jpg"
+    else:
+        item = message.document
+        filename = item.file_name or f"file_{item.file_unique_id}"
+
+    bot = message.bot
+    if bot.session.api.is_local:
+        return None
+    file = await bot.get_file(item.file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+
+    folder = staging_folder(session_id)
+    remote_path = f"{folder}/{item.file_unique_id}_{filename}"
+    try:
+        await nextcloud.mkcol(RELAY_STAGING_ROOT)
+        await nextcloud.mkcol(folder)
+        stream = bot.session.stream_content(url, timeout=RELAY_TIMEOUT, chunk_size=RELAY_CHUNK_SIZE, raise_for_status=True)
+        with track("telegram_relay", nbytes=file.file_size or 0):
+            await nextcloud.put_stream(remote_path, _buffered(stream, RELAY_BUFFER_CHUNKS), size=file.file_size)
+    except Exception:
+        logger.warning("Relay of %s failed, falling back to download", filename, exc_info=True)
+        return None
+    return {"remote": remote_path, "name": filename, "kind": "file"}
+
+
+async def discard_staging(nextcloud: NextCloudClient, session_id: Optional[str]) -> None:
+    if not session_id:
+        return
+    try:
+        await nextcloud.delete(staging_folder(session_id))
+    except Exception:
+        logger.warning("Could not remove staging folder for session %s", session_id, exc_info=True)
+
+
+def _modified(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class StagingSweeper:
+    """Removes staging folders of sessions that ended without a job (FSM expiry, spool eviction, abandoned chats).
+
+    Confirmed sessions clean up after themselves; this only catches what is left behind.
+    """
+
+    def __init__(self, nextcloud: NextCloudClient, ttl: float = RELAY_STAGING_TTL) -> None:
+        self._nextcloud = nextcloud
+        self._ttl = ttl
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep(self) -> int:
+        """Delete expired staging folders. Returns how many were removed."""
+        cutoff = time.time() - self._ttl
+        entries = await self._nextcloud.list_entries(RELAY_STAGING_ROOT)
+        removed = 0
+        for e in (entries or [])[1:]:
+            modified = _modified(str(e["last_modified"]))
+            if not e["is_dir"] or modified is None or modified >= cutoff:
+                continue
+            await self._nextcloud.delete(f"{RELAY_STAGING_ROOT}/{e['name']}")
+            removed += 1
+        if removed:
+            logger.info("Removed %d expired staging folder(s)", removed)
+        return removed
+
+    async def _sweep_loop(self, interval: float) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.warning("Staging sweep failed", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = RELAY_SWEEP_INTERVAL) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_loop(interval), name="staging-sweep")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
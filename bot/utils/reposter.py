@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+
+from bot.keyboards.inline import build_group_library_keyboard
+from bot.utils.library import LibraryCache
+
+
+LIBRARY_REPOST_QUIET = float(os.getenv("LIBRARY_REPOST_QUIET", "5"))
+LIBRARY_REPOST_MAX_DELAY = float(os.getenv("LIBRARY_REPOST_MAX_DELAY", "30"))
+LIBRARY_STATE_PATH = os.getenv("LIBRARY_STATE_PATH", "data/library_messages.json")
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatSlot:
+    __slots__ = ("last_message_id", "timer", "first_pending_at", "lock")
+
+    def __init__(self, last_message_id: Optional[int] = None) -> None:
+        self.last_message_id = last_message_id
+        self.timer: Optional[asyncio.Task] = None
+        self.first_pending_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+
+
+class LibraryReposter:
+    """Per-chat scheduler that keeps the library message at the bottom of a group.
+
+    A burst of messages is collapsed into one delete+send after ``quiet`` seconds of
+    silence, but a pending repost is never delayed more than ``max_delay`` seconds.
+    The last posted message id is persisted so it can be deleted after a restart.
+    """
+
+    def __init__(
+        self,
+        library: LibraryCache,
+        quiet: float = LIBRARY_REPOST_QUIET,
+        max_delay: float = LIBRARY_REPOST_MAX_DELAY,
+        state_path: str = LIBRARY_STATE_PATH,
+    ) -> None:
+        self._library = library
+        self._quiet = quiet
+        self._max_delay = max_delay
+        self._state_path = state_path
+        self._slots: Dict[int, _ChatSlot] = {}
+        self._load_state()
+
+    def _load_state(self) -> None:
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logger.warning("Ignoring unreadable library state file %s", self._state_path)
+            return
+        for chat_id, message_id in raw.items():
+            self._slots[int(chat_id)] = _ChatSlot(int(message_id))
+
+    def _save_state(self) -> None:
+        raw = {str(chat_id): slot.last_message_id for chat_id, slot in self._slots.items() if slot.last_message_id}
+        directory = os.path.dirname(self._state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self._state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(raw, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _slot(self, chat_id: int) -> _ChatSlot:
+        slot = self._slots.get(chat_id)
+        if slot is None:
+            slot = self._slots[chat_id] = _ChatSlot()
+        return slot
+
+    def schedule(self, bot: Bot, chat_id: int) -> None:
+        slot = self._slot(chat_id)
+        now = time.monotonic()
+        if slot.first_pending_at is None:
+            slot.first_pending_at = now
+        if slot.timer is not None:
+            slot.timer.cancel()
+        deadline = slot.first_pending_at + self._max_delay
+        delay = max(0.0, min(self._quiet, deadline - now))
+        slot.timer = asyncio.create_task(self._fire_later(bot, chat_id, delay))
+
+    async def post_now(self, bot: Bot, chat_id: int) -> None:
+        slot = self._slot(chat_id)
+        if slot.timer is not None:
+            slot.timer.cancel()
+            slot.timer = None
+        slot.first_pending_at = None
+        await self._repost(bot, chat_id)
+
+    async def _fire_later(self, bot: Bot, chat_id: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        slot = self._slot(chat_id)
+        # Past this point new messages start a fresh window instead of cancelling us
+        slot.timer = None
+        slot.first_pending_at = None
+        try:
+            await self._repost(bot, chat_id)
+        except Exception:
+            logger.exception("Library repost failed in chat %s", chat_id)
+
+    async def _repost(self, bot: Bot, chat_id: int) -> None:
+        slot = self._slot(chat_id)
+        async with slot.lock:
+            text = await self._library.get_message()
+            if slot.last_message_id:
+                try:
+                    await bot.delete_message(chat_id=chat_id, message_id=slot.last_message_id)
+                except Exception:
+                    pass
+            sent = await bot.send_message(
+                chat_id,
+                text,
+                reply_markup=build_group_library_keyboard(),
+                disable_web_page_preview=True,
+            )
+            slot.last_message_id = sent.message_id
+            self._save_state()
+
+    async def close(self) -> None:
+        timers = [slot.timer for slot in self._slots.values() if slot.timer is not None]
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "data/result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _sha256_file_sync(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+async def sha256_file(path: str) -> str:
+    return await asyncio.to_thread(_sha256_file_sync, path)
+
+
+def make_key(kind: str, *parts: str) -> str:
+    return sha256_text("\x1f".join((kind,) + parts))
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of text results with size-bounded LRU eviction.
+
+    Recency is tracked through file mtimes, so it survives restarts.
+    """
+
+    def __init__(self, directory: str = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES) -> None:
+        self._dir = directory
+        self._max_bytes = max_bytes
+        self._total: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, key[:2], f"{key}.txt")
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _scan(self):
+        for root, _dirs, names in os.walk(self._dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _set_sync(self, key: str, value: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(value)
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _p, size, _m in self._scan())
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total += os.path.getsize(path) - old_size
+            if self._total > self._max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until we are comfortably under the limit
+        target = int(self._max_bytes * 0.9)
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        removed = 0
+        for path, size, _mtime in entries:
+            if self._total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total -= size
+            removed += 1
+        logger.info("Result cache evicted %d entries, %d bytes left", removed, self._total)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set_sync, key, value)
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
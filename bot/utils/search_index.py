@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from html import escape
+from typing import List, NamedTuple, Optional
+
+
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", "data/search.sqlite3")
+SEARCH_SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "16"))
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lectures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    discipline TEXT NOT NULL,
+    date_str TEXT,
+    lesson_type TEXT,
+    topic TEXT NOT NULL,
+    pdf_path TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_texts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    body TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    lecture_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS document_texts_lecture_idx ON document_texts (lecture_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    topic, body, kind UNINDEXED, lecture_id UNINDEXED,
+    content = 'document_texts', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Sentinels around matches; replaced with <b> after the snippet has been HTML-escaped
+_HIT_START, _HIT_END = "\x02", "\x03"
+
+TRANSCRIPT = "transcript"
+CONSPECT = "conspect"
+
+
+class LectureDocument(NamedTuple):
+    key: str
+    discipline: str
+    date_str: Optional[str]
+    lesson_type: Optional[str]
+    topic: str
+    pdf_path: Optional[str]
+    transcript: str
+    conspect: str
+
+
+class SearchHit(NamedTuple):
+    topic: str
+    discipline: str
+    date_str: Optional[str]
+    lesson_type: Optional[str]
+    pdf_path: Optional[str]
+    kind: str
+    snippet_html: str
+
+
+def _fold(text: str) -> str:
+    # unicode61 does not fold ё into е, and Russian text uses both spellings. Only the index
+    # holds folded text: both letters take two bytes in UTF-8, so the token offsets FTS5 uses
+    # for snippets line up with the original text kept in document_texts.
+    return text.replace("ё", "е").replace("Ё", "Е")
+
+
+def lecture_key(lesson_folder: str, topic: str) -> str:
+    """Stable identity of a lecture: a retry re-indexes the same entry whatever name its PDF got."""
+    return f"{lesson_folder.strip('/')}/{topic}"
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """Every word of the query must occur, as a prefix so that word endings do not matter much."""
+    words = _WORD_RE.findall(_fold(text).lower())
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words[:12])
+
+
+def _snippet_html(raw: str) -> str:
+    return escape(raw).replace(_HIT_START, "<b>").replace(_HIT_END, "</b>")
+
+
+class SearchIndex:
+    """Full-text index (SQLite FTS5) of lecture transcripts and structured conspects.
+
+    ``add()`` only queues the document; a background task writes queued documents in
+    batches, so indexing never delays the lecture pipeline.
+    """
+
+    def __init__(self, path: str = SEARCH_DB_PATH) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # Topic matches weigh more than body matches; a configured rank lets FTS5 sort and limit by itself
+        self._db.execute("INSERT INTO documents (documents, rank) VALUES ('rank', 'bm25(4.0, 1.0)')")
+        self._lock = threading.Lock()
+        self._queue: "asyncio.Queue[LectureDocument]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, doc: LectureDocument) -> None:
+        self._queue.put_nowait(doc)
+
+    def _delete_documents(self, lecture_id: int) -> None:
+        # An external-content index forgets a row only when given the exact values it indexed
+        rows = self._db.execute(
+            "SELECT id, topic, body, kind FROM document_texts WHERE lecture_id = ?", (lecture_id,)
+        ).fetchall()
+        for rowid, topic, body, kind in rows:
+            self._db.execute(
+                "INSERT INTO documents (documents, rowid, topic, body, kind, lecture_id) VALUES ('delete', ?, ?, ?, ?, ?)",
+                (rowid, _fold(topic), _fold(body), kind, lecture_id),
+            )
+        self._db.execute("DELETE FROM document_texts WHERE lecture_id = ?", (lecture_id,))
+
+    def _write_sync(self, docs: List[LectureDocument]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for doc in docs:
+                    # Re-indexing the same lecture replaces its texts; a PDF path already known is kept
+                    lecture_id = self._db.execute(
+                        "INSERT INTO lectures (key, discipline, date_str, lesson_type, topic, pdf_path, indexed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                        "discipline = excluded.discipline, date_str = excluded.date_str, lesson_type = excluded.lesson_type, "
+                        "topic = excluded.topic, pdf_path = COALESCE(excluded.pdf_path, lectures.pdf_path), "
+                        "indexed_at = excluded.indexed_at RETURNING id",
+                        (doc.key, doc.discipline, doc.date_str, doc.lesson_type, doc.topic, doc.pdf_path, now),
+                    ).fetchone()[0]
+                    self._delete_documents(lecture_id)
+                    for kind, body in ((TRANSCRIPT, doc.transcript), (CONSPECT, doc.conspect)):
+                        if body:
+                            rowid = self._db.execute(
+                                "INSERT INTO document_texts (topic, body, kind, lecture_id) VALUES (?, ?, ?, ?)",
+                                (doc.topic, body, kind, lecture_id),
+                            ).lastrowid
+                            self._db.execute(
+                                "INSERT INTO documents (rowid, topic, body, kind, lecture_id) VALUES (?, ?, ?, ?, ?)",
+                                (rowid, _fold(doc.topic), _fold(body), kind, lecture_id),
+                            )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    async def _drain(self) -> None:
+        docs = [await self._queue.get()]
+        while not self._queue.empty():
+            docs.append(self._queue.get_nowait())
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_sync, docs)
+        except Exception:
+            logger.exception("Indexing %d lecture(s) failed", len(docs))
+        else:
+            logger.info("Indexed %d lecture(s) in %.0f ms", len(docs), (time.perf_counter() - started) * 1000)
+        finally:
+            for _ in docs:
+                self._queue.task_done()
+
+    async def _writer(self) -> None:
+        while True:
+            await self._drain()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer(), name="search-indexer")
+
+    def _search_sync(self, match: str, limit: int) -> List[SearchHit]:
+        hits: List[SearchHit] = []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT rowid, lecture_id FROM documents WHERE documents MATCH ? ORDER BY rank LIMIT ?", (match, limit * 2)
+            ).fetchall()
+            seen = set()
+            # A lecture can match in both its transcript and its conspect; keep the better ranked one.
+            # Snippets are built only for the rows actually shown.
+            for rowid, lecture_id in rows:
+                if lecture_id in seen or len(seen) >= limit:
+                    continue
+                seen.add(lecture_id)
+                row = self._db.execute(
+                    "SELECT l.topic, l.discipline, l.date_str, l.lesson_type, l.pdf_path, d.kind, "
+                    "snippet(documents, -1, ?, ?, '…', ?) FROM documents d JOIN lectures l ON l.id = d.lecture_id "
+                    "WHERE documents MATCH ? AND d.rowid = ?",
+                    (_HIT_START, _HIT_END, SEARCH_SNIPPET_TOKENS, match, rowid),
+                ).fetchone()
+                if row is not None:
+                    hits.append(SearchHit(*row[:6], _snippet_html(row[6])))
+        return hits
+
+    async def search(self, text: str, limit: int = 5) -> List[SearchHit]:
+        match = build_match_query(text)
+        if match is None:
+            return []
+        return await asyncio.to_thread(self._search_sync, match, limit)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # Write what is still queued before shutting down
+            if not self._queue.empty():
+                try:
+                    await asyncio.wait_for(self._queue.join(), 10)
+                except asyncio.TimeoutError:
+                    logger.warning("Dropping %d unindexed lecture(s) on shutdown", self._queue.qsize())
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,197 @@
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.fsm.context import FSMContext
+
+from bot.utils.fsm_storage import session_lock
+from config import TEMP_DIR
+
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(TEMP_DIR, "spool"))
+SPOOL_QUOTA_BYTES = int(os.getenv("SPOOL_QUOTA_BYTES", str(5 * 1024 * 1024 * 1024)))
+# Unpinned sessions idle for this long are abandoned and may be evicted
+SPOOL_IDLE_SECONDS = float(os.getenv("SPOOL_IDLE_SECONDS", str(6 * 3600)))
+
+_PIN = ".pinned"
+_UNSAFE = re.compile(r"[^\w.\-]+", re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+class Spool:
+    """Per-session temp directories with a global disk quota.
+
+    Every upload session gets its own directory; files in it get content-unique names.
+    A session is pinned while a job still needs its files. When the spool is over quota,
+    the least recently used unpinned sessions idle for ``idle_seconds`` are evicted.
+
+    Sizes are kept as running counters: the tree is walked once at startup, then
+    ``add``/``remove`` and session cleanup keep the totals current.
+    """
+
+    def __init__(self, root: str = SPOOL_DIR, quota_bytes: int = SPOOL_QUOTA_BYTES, idle_seconds: float = SPOOL_IDLE_SECONDS) -> None:
+        self._root = root
+        self._quota = quota_bytes
+        self._idle = idle_seconds
+        os.makedirs(self._root, exist_ok=True)
+        # session_id -> [bytes, last_used, pinned]; read from the quota check's worker thread
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, list] = {}
+        self._total = 0
+        self.rescan()
+
+    def new_session(self, user_id: int) -> str:
+        session_id = f"{user_id}_{uuid.uuid4().hex[:12]}"
+        os.makedirs(self.session_dir(session_id), exist_ok=True)
+        with self._lock:
+            self._sessions[session_id] = [0, time.time(), False]
+        return session_id
+
+    def session_dir(self, session_id: str) -> str:
+        return os.path.join(self._root, os.path.basename(session_id))
+
+    async def session_for(self, state: FSMContext, user_id: int) -> str:
+        async with session_lock(state):
+            data = await state.get_data()
+            session_id = data.get("spool_session")
+            if not session_id:
+                session_id = self.new_session(user_id)
+                await state.update_data(spool_session=session_id)
+            return session_id
+
+    def path(self, session_id: str, filename: str, unique_id: Optional[str] = None) -> str:
+        directory = self.session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        os.utime(directory)
+        with self._lock:
+            self._session(session_id)[1] = time.time()
+        safe = _UNSAFE.sub("_", os.path.basename(filename or "file")).strip("._") or "file"
+        return os.path.join(directory, f"{unique_id or uuid.uuid4().hex[:8]}_{safe}")
+
+    def _session(self, session_id: str) -> list:
+        session_id = os.path.basename(session_id)
+        info = self._sessions.get(session_id)
+        if info is None:
+            info = self._sessions[session_id] = [0, time.time(), False]
+        return info
+
+    def add(self, session_id: str, path: str) -> None:
+        """Count a file that was just written into the session directory."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            info = self._session(session_id)
+            info[0] += size
+            info[1] = time.time()
+            self._total += size
+
+    def remove(self, session_id: str, path: str) -> None:
+        """Delete one file of the session and take it off the counters."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            info = self._session(session_id)
+            freed = min(size, info[0])
+            info[0] -= freed
+            self._total -= freed
+
+    def pin(self, session_id: str) -> None:
+        directory = self.session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, _PIN), "w").close()
+        with self._lock:
+            self._session(session_id)[2] = True
+
+    def unpin(self, session_id: str) -> None:
+        try:
+            os.remove(os.path.join(self.session_dir(session_id), _PIN))
+        except FileNotFoundError:
+            pass
+        # The job wrote its own files (converted audio, PDFs) next to the uploads: recount this one session
+        size, last_used = self._measure(self.session_dir(session_id))
+        with self._lock:
+            info = self._session(session_id)
+            self._total += size - info[0]
+            info[0], info[1], info[2] = size, max(info[1], last_used), False
+
+    def cleanup(self, session_id: Optional[str]) -> None:
+        if session_id:
+            shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
+            with self._lock:
+                info = self._sessions.pop(os.path.basename(session_id), None)
+                if info is not None:
+                    self._total -= info[0]
+
+    @staticmethod
+    def _measure(directory: str) -> Tuple[int, float]:
+        size = 0
+        try:
+            last_used = os.stat(directory).st_mtime
+        except OSError:
+            return 0, 0.0
+        for root, _dirs, files in os.walk(directory):
+            for name in files:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                size += st.st_size
+                last_used = max(last_used, st.st_mtime)
+        return size, last_used
+
+    def rescan(self) -> None:
+        """Rebuild the counters from disk. Walks every session; meant for startup only."""
+        sessions: Dict[str, list] = {}
+        for entry in os.scandir(self._root):
+            if not entry.is_dir():
+                continue
+            size, last_used = self._measure(entry.path)
+            pinned = os.path.exists(os.path.join(entry.path, _PIN))
+            sessions[entry.name] = [size, last_used, pinned]
+        with self._lock:
+            self._sessions = sessions
+            self._total = sum(info[0] for info in sessions.values())
+
+    def _snapshot(self) -> List[Tuple[str, int, float, bool]]:
+        with self._lock:
+            return [(session_id, *info) for session_id, info in self._sessions.items()]
+
+    def usage(self) -> Dict[str, int]:
+        sessions = self._snapshot()
+        return {
+            "bytes": self._total,
+            "quota_bytes": self._quota,
+            "sessions": len(sessions),
+            "pinned": sum(1 for s in sessions if s[3]),
+        }
+
+    def enforce_quota(self) -> int:
+        """Evict abandoned sessions, oldest first, until the spool fits its quota. Returns bytes freed."""
+        total = self._total
+        if total <= self._quota:
+            return 0
+        sessions = self._snapshot()
+        cutoff = time.time() - self._idle
+        freed = 0
+        for session_id, size, last_used, pinned in sorted(sessions, key=lambda s: s[2]):
+            if total - freed <= self._quota:
+                break
+            if pinned or last_used > cutoff:
+                continue
+            self.cleanup(session_id)
+            freed += size
+            logger.info("Evicted abandoned spool session %s (%d bytes)", session_id, size)
+        if total - freed > self._quota:
+            logger.warning("Spool is over quota: %d of %d bytes in use by active sessions", total - freed, self._quota)
+        return freed
@@ -0,0 +1,110 @@
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+import time
+from typing import Callable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Collects how long each boot phase took and logs the breakdown once the bot is up."""
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        self._started = started if started is not None else time.perf_counter()
+        self._last = self._started
+        self._phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self._phases.append((phase, now - self._last))
+        self._last = now
+
+    def log(self) -> None:
+        total = self._last - self._started
+        breakdown = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self._phases)
+        logger.info("Startup took %.0f ms: %s", total * 1000, breakdown)
+
+
+def _check_binary(name: str, *args: str) -> Tuple[bool, str]:
+    path = shutil.which(name)
+    if path is None:
+        return False, f"{name} not found in PATH"
+    try:
+        out = subprocess.run([path, *args], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return False, f"{path}: {e}"
+    first_line = (out.stdout or out.stderr).strip().splitlines()[:1]
+    return out.returncode == 0, f"{path}: {first_line[0] if first_line else 'exit ' + str(out.returncode)}"
+
+
+def _check_ffmpeg() -> Tuple[bool, str]:
+    return _check_binary("ffmpeg", "-version")
+
+
+def _check_ffprobe() -> Tuple[bool, str]:
+    return _check_binary("ffprobe", "-version")
+
+
+def _check_wkhtmltopdf() -> Tuple[bool, str]:
+    from bot.utils.file_processing import WKHTMLTOPDF_BIN
+
+    return _check_binary(WKHTMLTOPDF_BIN, "--version")
+
+
+def _check_font() -> Tuple[bool, str]:
+    from bot.utils.file_processing import PDF_FONT_NAME, PDF_FONT_PATH, pdf_font
+
+    return pdf_font() == PDF_FONT_NAME, PDF_FONT_PATH
+
+
+def _check_mathjax() -> Tuple[bool, str]:
+    from bot.utils.file_processing import MATHJAX_CDN_URL, MATHJAX_PATH, WKHTMLTOPDF_BIN
+
+    if os.path.exists(MATHJAX_PATH):
+        return True, MATHJAX_PATH
+    if shutil.which(WKHTMLTOPDF_BIN) is None:
+        # The fallback renderer does not typeset formulas at all
+        return True, f"{MATHJAX_PATH} missing, not used without wkhtmltopdf"
+    fallback = f"the CDN ({MATHJAX_CDN_URL})" if MATHJAX_CDN_URL else "nothing, formulas stay TeX source"
+    return False, f"{MATHJAX_PATH} missing, rendering would fall back to {fallback}; see README"
+
+
+def _check_libraries() -> Tuple[bool, str]:
+    import PIL
+    import reportlab
+
+    # pydub has no version attribute; being importable is all that matters
+    if importlib.util.find_spec("pydub") is None:
+        return False, "pydub is not installed"
+    return True, f"Pillow {PIL.__version__}, reportlab {reportlab.Version}, pydub"
+
+
+# (name, check, required): a failed optional check only prints a warning
+CHECKS: List[Tuple[str, Callable[[], Tuple[bool, str]], bool]] = [
+    ("ffmpeg", _check_ffmpeg, True),
+    ("ffprobe", _check_ffprobe, True),
+    ("wkhtmltopdf", _check_wkhtmltopdf, False),
+    ("PDF font", _check_font, True),
+    ("MathJax bundle", _check_mathjax, True),
+    ("Python libraries", _check_libraries, True),
+]
+
+
+def run_checks() -> bool:
+    """Verify the external tools and files the pipelines need. Returns False if a required one is missing."""
+    healthy = True
+    for name, check, required in CHECKS:
+        started = time.perf_counter()
+        try:
+            ok, detail = check()
+        except Exception as e:
+            ok, detail = False, f"{e.__class__.__name__}: {e}"
+        status = "ok" if ok else ("FAIL" if required else "warn")
+        print(f"[{status:>4}] {name}: {detail} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        if required and not ok:
+            healthy = False
+    return healthy
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Dict, List
+
+from config import VSEGPT_CHAT_MODEL
+from bot.utils.result_cache import get_result_cache, make_key, sha256_text
+from bot.utils.vsegpt import chat_completion
+
+
+# Rough budget for Russian text; the provider's own tokenizer is not available locally
+CHARS_PER_TOKEN = float(os.getenv("STRUCTURE_CHARS_PER_TOKEN", "3"))
+# Transcripts above this many tokens are structured section by section
+STRUCTURE_SECTION_TOKENS = int(os.getenv("STRUCTURE_SECTION_TOKENS", "6000"))
+STRUCTURE_SECTION_MAX_TOKENS = int(os.getenv("STRUCTURE_SECTION_MAX_TOKENS", "4000"))
+# The merge pass rewrites the whole joined text, so it only runs when that fits both its
+# request (input) and the model's completion cap (output); otherwise sections are concatenated
+STRUCTURE_MERGE_INPUT_TOKENS = int(os.getenv("STRUCTURE_MERGE_INPUT_TOKENS", "12000"))
+STRUCTURE_MERGE_MAX_TOKENS = int(os.getenv("STRUCTURE_MERGE_MAX_TOKENS", "4000"))
+STRUCTURE_CONCURRENCY = int(os.getenv("STRUCTURE_CONCURRENCY", "3"))
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def split_sections(text: str, budget_tokens: int) -> List[str]:
+    """Split ``text`` into chunks of at most ``budget_tokens``, cutting between sentences."""
+    budget_chars = int(budget_tokens * CHARS_PER_TOKEN)
+    sections: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in _SENTENCE_END.split(text.strip()):
+        pieces = [sentence]
+        if len(sentence) > budget_chars:
+            # A run-on "sentence" without punctuation: fall back to word boundaries
+            words = sentence.split()
+            pieces, buf, buf_len = [], [], 0
+            for w in words:
+                if buf and buf_len + len(w) + 1 > budget_chars:
+                    pieces.append(" ".join(buf))
+                    buf, buf_len = [], 0
+                buf.append(w)
+                buf_len += len(w) + 1
+            if buf:
+                pieces.append(" ".join(buf))
+        for piece in pieces:
+            if current and size + len(piece) + 1 > budget_chars:
+                sections.append(" ".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        sections.append(" ".join(current))
+    return sections
+
+
+async def structure_lecture_text(prompts: Dict[str, str], raw_text: str) -> str:
+    """Structure a transcript, map-reducing over sections when it does not fit one request."""
+    system_prompt = prompts["system_prompt"]
+    if estimate_tokens(raw_text) <= STRUCTURE_SECTION_TOKENS:
+        content, usage = await chat_completion([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": raw_text},
+        ])
+        logger.info("Structured transcript in one pass, usage=%s", usage)
+        return content
+
+    sections = split_sections(raw_text, STRUCTURE_SECTION_TOKENS)
+    total = len(sections)
+    semaphore = asyncio.Semaphore(STRUCTURE_CONCURRENCY)
+    cache = get_result_cache()
+
+    async def structure_section(index: int, section: str) -> str:
+        section_prompt = prompts.get("section_prompt", "").format(index=index + 1, total=total)
+        system = f"{system_prompt}\n\n{section_prompt}".strip()
+        # Each section is cached on its own, so a retry after a failure only pays for the missing ones
+        key = make_key("structure-section", sha256_text(system), sha256_text(section), VSEGPT_CHAT_MODEL)
+        content = await cache.get(key)
+        if content is not None:
+            return content
+        async with semaphore:
+            started = time.monotonic()
+            content, usage = await chat_completion([
+                {"role": "system", "content": system},
+                {"role": "user", "content": section},
+            ], max_tokens=STRUCTURE_SECTION_MAX_TOKENS)
+        logger.info(
+            "Structured section %d/%d in %.1f s: prompt_tokens=%s completion_tokens=%s",
+            index + 1, total, time.monotonic() - started,
+            usage.get("prompt_tokens"), usage.get("completion_tokens"),
+        )
+        await cache.set(key, content)
+        return content
+
+    # Let every section finish (and be cached) even if one of them fails
+    outputs = await asyncio.gather(*(structure_section(i, s) for i, s in enumerate(sections)), return_exceptions=True)
+    failed = [o for o in outputs if isinstance(o, BaseException)]
+    if failed:
+        logger.warning("%d of %d sections failed to structure", len(failed), total)
+        raise failed[0]
+    joined = "\n\n".join(o.strip() for o in outputs)
+
+    merge_prompt = prompts.get("merge_prompt")
+    if not merge_prompt or estimate_tokens(joined) > min(STRUCTURE_MERGE_INPUT_TOKENS, STRUCTURE_MERGE_MAX_TOKENS):
+        logger.info("Merged %d sections by concatenation", total)
+        return joined
+    started = time.monotonic()
+    try:
+        merged, usage = await chat_completion([
+            {"role": "system", "content": merge_prompt},
+            {"role": "user", "content": joined},
+        ], max_tokens=STRUCTURE_MERGE_MAX_TOKENS)
+    except Exception:
+        logger.warning("Merging %d sections failed, concatenating them instead", total, exc_info=True)
+        return joined
+    if not merged.strip() or (usage.get("completion_tokens") or 0) >= STRUCTURE_MERGE_MAX_TOKENS:
+        # An empty or truncated merge would lose content the sections have
+        logger.warning("Merge of %d sections came back incomplete, concatenating them instead", total)
+        return joined
+    logger.info(
+        "Merged %d sections in %.1f s: prompt_tokens=%s completion_tokens=%s",
+        total, time.monotonic() - started, usage.get("prompt_tokens"), usage.get("completion_tokens"),
+    )
+    return merged
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+from typing import TYPE_CHECKING, List, Tuple
+
+from config import VSEGPT_STT_MODEL
+from bot.utils.file_processing import STT_AUDIO_BITRATE, STT_AUDIO_FORMAT, STT_AUDIO_SAMPLE_RATE, export_stt_audio
+from bot.utils.result_cache import get_result_cache, make_key, sha256_file
+from bot.utils.vsegpt import transcribe_audio
+from bot.utils.workers import run_in_process
+
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+
+# Audio longer than STT_SPLIT_THRESHOLD seconds is cut into ~STT_SEGMENT_SECONDS pieces
+STT_SPLIT_THRESHOLD = float(os.getenv("STT_SPLIT_THRESHOLD", "900"))
+STT_SEGMENT_SECONDS = float(os.getenv("STT_SEGMENT_SECONDS", "600"))
+STT_SEGMENT_OVERLAP = float(os.getenv("STT_SEGMENT_OVERLAP", "4"))
+STT_SEGMENT_CONCURRENCY = int(os.getenv("STT_SEGMENT_CONCURRENCY", "3"))
+# How far from the nominal cut point we look for a pause
+STT_SILENCE_SEARCH = float(os.getenv("STT_SILENCE_SEARCH", "30"))
+# Decoding a long recording and scanning it for pauses is CPU-bound; each one holds the whole audio in memory
+STT_SPLIT_CONCURRENCY = int(os.getenv("STT_SPLIT_CONCURRENCY", "1"))
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _audio_duration(path: str) -> float:
+    from pydub.utils import mediainfo
+
+    try:
+        return float(mediainfo(path).get("duration") or 0)
+    except Exception:
+        return 0.0
+
+
+def _find_cut(audio: "AudioSegment", target_ms: int) -> int:
+    from pydub.silence import detect_silence
+
+    # Cut in the middle of the pause closest to target_ms, or exactly at target_ms if there is none
+    search = int(STT_SILENCE_SEARCH * 1000)
+    lo = max(0, target_ms - search)
+    hi = min(len(audio), target_ms + search)
+    window = audio[lo:hi]
+    silences = detect_silence(window, min_silence_len=400, silence_thresh=window.dBFS - 16, seek_step=10)
+    if not silences:
+        return target_ms
+    mids = [lo + (start + end) // 2 for start, end in silences]
+    return min(mids, key=lambda m: abs(m - target_ms))
+
+
+def _split_audio(path: str, out_dir: str) -> List[Tuple[str, int, int]]:
+    """Cut ``path`` into overlapping segments; returns (segment path, start ms, end ms) for each.
+
+    Runs in the process pool.
+    """
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(path)
+    total = len(audio)
+    step = int(STT_SEGMENT_SECONDS * 1000)
+    overlap = int(STT_SEGMENT_OVERLAP * 1000)
+
+    cuts = [0]
+    while total - cuts[-1] > step * 1.5:
+        cuts.append(_find_cut(audio, cuts[-1] + step))
+    cuts.append(total)
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i, (start, end) in enumerate(zip(cuts, cuts[1:])):
+        start, end = max(0, start - overlap), min(total, end + overlap)
+        seg_path = export_stt_audio(audio[start:end], os.path.join(out_dir, f"segment_{i:03d}.{STT_AUDIO_FORMAT}"))
+        paths.append((seg_path, start, end))
+    return paths
+
+
+def _norm(word: str) -> str:
+    return "".join(_WORD_RE.findall(word.lower()))
+
+
+def _drop_overlap(prev: str, nxt: str, window: int = 40, min_match: int = 3) -> str:
+    """Strip from ``nxt`` the words that repeat the end of ``prev``."""
+    a = prev.split()
+    b = nxt.split()
+    na = [_norm(w) for w in a[-window:]]
+    nb = [_norm(w) for w in b[:window]]
+    drop = 0
+    for n in range(min(len(na), len(nb)), min_match - 1, -1):
+        if na[-n:] == nb[:n]:
+            drop = n
+            break
+    if not drop and len(na) >= min_match:
+        # The overlap may be worded differently at its edges: anchor on the last words of prev
+        tail = na[-min_match:]
+        for i in range(len(nb) - min_match + 1):
+            if nb[i:i + min_match] == tail:
+                drop = i + min_match
+                break
+    return " ".join(b[drop:])
+
+
+def stitch_segments(texts: List[str]) -> str:
+    merged = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        merged = f"{merged} {_drop_overlap(merged, text)}" if merged else text
+    return merged.strip()
+
+
+async def transcribe_lecture_audio(path: str, language: str = "ru") -> str:
+    """Transcribe a recording, splitting long ones at pauses and transcribing the pieces concurrently."""
+    duration = await run_in_process("split", STT_SPLIT_CONCURRENCY, _audio_duration, path)
+    if duration <= STT_SPLIT_THRESHOLD:
+        return await transcribe_audio(path, language=language)
+
+    out_dir = f"{os.path.splitext(path)[0]}_segments"
+    segments = await run_in_process("split", STT_SPLIT_CONCURRENCY, _split_audio, path, out_dir)
+    logger.info("Transcribing %s (%.0f s) in %d segments", path, duration, len(segments))
+    semaphore = asyncio.Semaphore(STT_SEGMENT_CONCURRENCY)
+    cache = get_result_cache()
+    # Segment files are not byte-stable (ogg stamps random stream serials), so a segment is
+    # identified by the recording's content, its bounds and the export profile instead
+    source = await sha256_file(path)
+    profile = f"{STT_AUDIO_FORMAT}/{STT_AUDIO_BITRATE}/{STT_AUDIO_SAMPLE_RATE}"
+
+    async def one(seg_path: str, start: int, end: int) -> str:
+        # A rerun after a failure only re-sends the segments that did not come back
+        key = make_key("stt-segment", source, str(start), str(end), profile, VSEGPT_STT_MODEL, language)
+        text = await cache.get(key)
+        if text is not None:
+            return text
+        async with semaphore:
+            text = await transcribe_audio(seg_path, language=language)
+        await cache.set(key, text)
+        return text
+
+    try:
+        # Let every segment finish (and be cached) even if one of them fails
+        results = await asyncio.gather(*(one(*segment) for segment in segments), return_exceptions=True)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        logger.warning("%d of %d segments of %s failed", len(failed), len(segments), path)
+        raise failed[0]
+    return stitch_segments(list(results))
@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from config import ROOT_FOLDER
+
+if TYPE_CHECKING:
+    from bot.utils.nextcloud import NextCloudClient
+
+
+TREE_DB_PATH = os.getenv("TREE_DB_PATH", "data/tree.sqlite3")
+TREE_SYNC_INTERVAL = float(os.getenv("TREE_SYNC_INTERVAL", "600"))
+TREE_SYNC_CONCURRENCY = int(os.getenv("TREE_SYNC_CONCURRENCY", "4"))
+# A folder listed this recently answers name and existence checks without asking NextCloud
+TREE_TRUST_SECONDS = float(os.getenv("TREE_TRUST_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    modified REAL NOT NULL DEFAULT 0,
+    listed_at REAL
+);
+CREATE INDEX IF NOT EXISTS entries_parent_idx ON entries (parent);
+CREATE INDEX IF NOT EXISTS entries_recent_idx ON entries (is_dir, modified);
+"""
+
+
+class IndexEntry(NamedTuple):
+    id: int
+    path: str
+    name: str
+    is_dir: bool
+    size: int
+    modified: float
+
+
+_ENTRY_COLUMNS = "id, path, name, is_dir, size, modified"
+
+
+def _entry(row: tuple) -> IndexEntry:
+    return IndexEntry(row[0], row[1], row[2], bool(row[3]), row[4], row[5])
+
+
+def _parent(path: str) -> str:
+    return path.rsplit("/", 1)[0] if "/" in path else ""
+
+
+def _modified(value: str) -> float:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TreeIndex:
+    """Local SQLite mirror of the ``ROOT_FOLDER`` tree on NextCloud.
+
+    ``sync()`` lists only collections whose ETag changed since the last walk (NextCloud
+    propagates ETags up to every ancestor), and the client records the bot's own
+    MKCOL/PUT/MOVE/COPY/DELETE calls in place. Hidden entries are skipped.
+    """
+
+    def __init__(self, path: str = TREE_DB_PATH, root: str = ROOT_FOLDER) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._root = root.strip("/")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.execute(
+            "INSERT OR IGNORE INTO entries (path, parent, name, is_dir) VALUES (?, ?, ?, 1)",
+            (self._root, _parent(self._root), os.path.basename(self._root)),
+        )
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    def covers(self, path: str) -> bool:
+        path = path.strip("/")
+        if path != self._root and not path.startswith(self._root + "/"):
+            return False
+        return not any(part.startswith(".") for part in path[len(self._root):].split("/"))
+
+    # Reads
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    async def get(self, entry_id: int) -> Optional[IndexEntry]:
+        rows = await asyncio.to_thread(self._query, f"SELECT {_ENTRY_COLUMNS} FROM entries WHERE id = ?", (entry_id,))
+        return _entry(rows[0]) if rows else None
+
+    async def get_path(self, path: str) -> Optional[IndexEntry]:
+        rows = await asyncio.to_thread(self._query, f"SELECT {_ENTRY_COLUMNS} FROM entries WHERE path = ?", (path.strip("/"),))
+        return _entry(rows[0]) if rows else None
+
+    async def children(self, folder: str) -> List[IndexEntry]:
+        rows = await asyncio.to_thread(
+            self._query,
+            f"SELECT {_ENTRY_COLUMNS} FROM entries WHERE parent = ? ORDER BY is_dir DESC, modified DESC, name",
+            (folder.strip("/"),),
+        )
+        return [_entry(r) for r in rows]
+
+    async def recent(self, limit: int = 10, under: Optional[str] = None) -> List[IndexEntry]:
+        prefix = (under or self._root).strip("/") + "/"
+        rows = await asyncio.to_thread(
+            self._query,
+            f"SELECT {_ENTRY_COLUMNS} FROM entries WHERE is_dir = 0 AND substr(path, 1, ?) = ? ORDER BY modified DESC LIMIT ?",
+            (len(prefix), prefix, limit),
+        )
+        return [_entry(r) for r in rows]
+
+    def _fresh_names_sync(self, folder: str, cutoff: float) -> Optional[Set[str]]:
+        with self._lock:
+            row = self._db.execute("SELECT listed_at FROM entries WHERE path = ? AND is_dir = 1", (folder,)).fetchone()
+            if row is None or row[0] is None or row[0] < cutoff:
+                return None
+            return {r[0] for r in self._db.execute("SELECT name FROM entries WHERE parent = ?", (folder,))}
+
+    async def folder_names(self, folder: str) -> Optional[Set[str]]:
+        """Names in ``folder`` if its listing is recent enough to trust, else None."""
+        folder = folder.strip("/")
+        if not self.covers(folder):
+            return None
+        return await asyncio.to_thread(self._fresh_names_sync, folder, time.time() - TREE_TRUST_SECONDS)
+
+    # Writes
+
+    def _write(self, statements: Iterable[Tuple[str, tuple]]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _ensure_parents(self, path: str) -> List[Tuple[str, tuple]]:
+        statements = []
+        parent = _parent(path)
+        while parent and parent != self._root and parent.startswith(self._root + "/"):
+            statements.append((
+                "INSERT OR IGNORE INTO entries (path, parent, name, is_dir) VALUES (?, ?, ?, 1)",
+                (parent, _parent(parent), os.path.basename(parent)),
+            ))
+            parent = _parent(parent)
+        return statements
+
+    @staticmethod
+    def _upsert(path: str, is_dir: bool, size: int, etag: Optional[str], modified: float) -> Tuple[str, tuple]:
+        # A folder keeps its stored ETag here: it is only advanced once its children have been walked
+        return (
+            "INSERT INTO entries (path, parent, name, is_dir, size, etag, modified) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET is_dir = excluded.is_dir, size = excluded.size, modified = excluded.modified, "
+            "etag = CASE WHEN excluded.is_dir THEN entries.etag ELSE excluded.etag END",
+            (path, _parent(path), os.path.basename(path), int(is_dir), size, None if is_dir else etag, modified),
+        )
+
+    @staticmethod
+    def _delete(path: str) -> Tuple[str, tuple]:
+        return ("DELETE FROM entries WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(path) + 1, path + "/"))
+
+    async def record_dir(self, path: str, created: bool) -> None:
+        path = path.strip("/")
+        if not self.covers(path):
+            return
+        now = time.time()
+        statements = self._ensure_parents(path) + [(
+            "INSERT INTO entries (path, parent, name, is_dir, modified, listed_at) VALUES (?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET is_dir = 1, listed_at = COALESCE(excluded.listed_at, entries.listed_at)",
+            (path, _parent(path), os.path.basename(path), now, now if created else None),
+        )]
+        if created:
+            # A folder we just created is known to be empty, whatever the index remembered there
+            statements.append(("DELETE FROM entries WHERE substr(path, 1, ?) = ?", (len(path) + 1, path + "/")))
+        await asyncio.to_thread(self._write, statements)
+
+    async def record_file(self, path: str, size: int, etag: Optional[str] = None) -> None:
+        path = path.strip("/")
+        if not self.covers(path):
+            return
+        statements = self._ensure_parents(path) + [self._upsert(path, False, size, etag, time.time())]
+        await asyncio.to_thread(self._write, statements)
+
+    def _copy_sync(self, src: str, dst: str, move: bool) -> None:
+        rows = self._query(
+            "SELECT path, is_dir, size, etag FROM entries WHERE path = ? OR substr(path, 1, ?) = ?",
+            (src, len(src) + 1, src + "/"),
+        ) if self.covers(src) else []
+        now = time.time()
+        statements = self._ensure_parents(dst) + [self._delete(dst)]
+        if rows:
+            for path, is_dir, size, etag in rows:
+                statements.append(self._upsert(dst + path[len(src):], bool(is_dir), size, etag, now))
+        else:
+            # Not indexed (e.g. relayed into staging outside the library): the next sync fills in the size
+            statements.append(self._upsert(dst, False, 0, None, now))
+        if move and rows:
+            statements.append(self._delete(src))
+        self._write(statements)
+
+    async def record_copy(self, src: str, dst: str, move: bool = False) -> None:
+        src, dst = src.strip("/"), dst.strip("/")
+        if not self.covers(dst):
+            if move and self.covers(src):
+                await self.record_remove(src)
+            return
+        await asyncio.to_thread(self._copy_sync, src, dst, move)
+
+    async def record_remove(self, path: str) -> None:
+        path = path.strip("/")
+        if not self.covers(path) or path == self._root:
+            return
+        await asyncio.to_thread(self._write, [self._delete(path)])
+
+    def _apply_listing_sync(self, folder: str, children: List[Dict[str, object]]) -> Dict[str, Optional[str]]:
+        """Store a fresh depth-1 listing; returns the previously stored ETag of each child folder."""
+        with self._lock:
+            stored = {
+                name: (bool(is_dir), etag)
+                for name, is_dir, etag in self._db.execute("SELECT name, is_dir, etag FROM entries WHERE parent = ?", (folder,))
+            }
+        statements: List[Tuple[str, tuple]] = []
+        seen = set()
+        previous: Dict[str, Optional[str]] = {}
+        for e in children:
+            name = str(e["name"])
+            if name.startswith("."):
+                continue
+            seen.add(name)
+            if e["is_dir"]:
+                was_dir, etag = stored.get(name, (True, None))
+                previous[name] = etag if was_dir else None
+            statements.append(self._upsert(f"{folder}/{name}", bool(e["is_dir"]), int(e["size"]), str(e["etag"]), _modified(str(e["last_modified"]))))
+        for name in stored.keys() - seen:
+            statements.append(self._delete(f"{folder}/{name}"))
+        statements.append(("UPDATE entries SET listed_at = ? WHERE path = ?", (time.time(), folder)))
+        self._write(statements)
+        return previous
+
+    async def forget_listing(self, folder: str) -> None:
+        """Stop trusting the stored listing of ``folder``, e.g. after the server rejected a name it did not know."""
+        folder = folder.strip("/")
+        if self.covers(folder):
+            await asyncio.to_thread(self._write, [("UPDATE entries SET listed_at = NULL WHERE path = ?", (folder,))])
+
+    async def record_listing(self, folder: str, entries: List[Dict[str, object]]) -> None:
+        """Feed a live PROPFIND listing (folder itself first) into the index."""
+        folder = folder.strip("/")
+        if self.covers(folder) and entries:
+            await asyncio.to_thread(self._apply_listing_sync, folder, entries[1:])
+
+    # Sync
+
+    async def _sync_folder(self, nextcloud: "NextCloudClient", folder: str, semaphore: asyncio.Semaphore, known_etag: Optional[str]) -> int:
+        async with semaphore:
+            entries = await nextcloud.list_entries(folder)
+        if entries is None:
+            await self.record_remove(folder)
+            return 1
+        etag = str(entries[0]["etag"])
+        if known_etag is not None and etag == known_etag:
+            return 1
+        previous = await asyncio.to_thread(self._apply_listing_sync, folder, entries[1:])
+        changed = [
+            f"{folder}/{e['name']}"
+            for e in entries[1:]
+            if e["is_dir"] and not str(e["name"]).startswith(".") and previous.get(str(e["name"])) != e["etag"]
+        ]
+        counts = await asyncio.gather(*(self._sync_folder(nextcloud, path, semaphore, None) for path in changed))
+        # Only now is the whole subtree consistent with this ETag
+        await asyncio.to_thread(self._write, [("UPDATE entries SET etag = ? WHERE path = ?", (etag, folder))])
+        return 1 + sum(counts)
+
+    async def sync(self, nextcloud: "NextCloudClient") -> int:
+        """Bring the index up to date. Returns the number of folders listed."""
+        async with self._sync_lock:
+            started = time.perf_counter()
+            rows = await asyncio.to_thread(self._query, "SELECT etag FROM entries WHERE path = ?", (self._root,))
+            known = rows[0][0] if rows else None
+            listed = await self._sync_folder(nextcloud, self._root, asyncio.Semaphore(TREE_SYNC_CONCURRENCY), known)
+            logger.info("Tree index synced: %d folder(s) listed in %.2f s", listed, time.perf_counter() - started)
+            return listed
+
+    async def _sync_loop(self, nextcloud: "NextCloudClient", interval: float) -> None:
+        while True:
+            try:
+                await self.sync(nextcloud)
+            except Exception:
+                logger.warning("Tree index sync failed", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def start(self, nextcloud: "NextCloudClient", interval: float = TREE_SYNC_INTERVAL) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop(nextcloud, interval), name="tree-index-sync")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from bot.utils.nextcloud import NextCloudClient
+
+
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+class UploadResult(NamedTuple):
+    label: str
+    remote_path: Optional[str]
+    error: Optional[str]
+    # Stable id of the upload across retries; labels are display names and may repeat
+    key: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class UploadStage:
+    """Runs NextCloud uploads concurrently (at most ``limit`` at a time) and collects a per-file report.
+
+    Uploads start as soon as they are added, so they overlap with whatever the caller does next.
+    Every upload has a ``key`` that stays the same across retries (a role such as ``"note"``, or
+    the source path of a user file). ``done`` maps keys already uploaded by an earlier run to
+    their remote paths; those are reported as-is and not uploaded again.
+    """
+
+    def __init__(self, nextcloud: NextCloudClient, limit: int = UPLOAD_CONCURRENCY, done: Optional[Dict[str, str]] = None) -> None:
+        self._nextcloud = nextcloud
+        self._semaphore = asyncio.Semaphore(limit)
+        self._tasks: List[asyncio.Task] = []
+        self._failures: List[UploadResult] = []
+        self._done = dict(done or {})
+        self._reused: List[UploadResult] = []
+
+    def _reuse(self, key: str, label: str) -> bool:
+        if key not in self._done:
+            return False
+        self._reused.append(UploadResult(label, self._done[key], None, key))
+        return True
+
+    def add(self, local_path: str, folder_path: str, name: str, unique: bool = True, label: Optional[str] = None, key: Optional[str] = None) -> None:
+        key = key or local_path
+        if self._reuse(key, label or name):
+            return
+        self._tasks.append(asyncio.create_task(self._upload(local_path, folder_path, name, unique, label or name, key)))
+
+    def add_with_copy(self, local_path: str, folder_path: str, name: str, copy_folder: str, copy_name: str, key: str) -> None:
+        """Upload once, then place the second copy with a server-side COPY instead of a second PUT.
+
+        The copy is checkpointed as ``<key>:copy``.
+        """
+        copy_key = f"{key}:copy"
+        if key in self._done and copy_key in self._done:
+            self._reuse(key, name)
+            self._reuse(copy_key, copy_name)
+            return
+        self._tasks.append(asyncio.create_task(self._upload_and_copy(local_path, folder_path, name, copy_folder, copy_name, key, copy_key)))
+
+    def add_move(self, remote_path: str, folder_path: str, name: str, key: Optional[str] = None) -> None:
+        """Move a file that is already on the server (e.g. relayed to staging) into place."""
+        key = key or remote_path
+        if self._reuse(key, name):
+            return
+        self._tasks.append(asyncio.create_task(self._move(remote_path, folder_path, name, key)))
+
+    def fail(self, label: str, exc: BaseException) -> None:
+        logger.error("%s failed: %r", label, exc)
+        self._failures.append(UploadResult(label, None, str(exc) or exc.__class__.__name__))
+
+    async def _upload(self, local_path: str, folder_path: str, name: str, unique: bool, label: str, key: str) -> UploadResult:
+        try:
+            async with self._semaphore:
+                if unique:
+                    remote_path = await self._nextcloud.upload_file_unique(local_path, folder_path, name)
+                else:
+                    remote_path = f"{folder_path}/{name}"
+                    await self._nextcloud.upload_file_to_nextcloud(local_path, remote_path)
+            return UploadResult(label, remote_path, None, key)
+        except Exception as e:
+            logger.exception("Upload of %s to %s failed", local_path, folder_path)
+            return UploadResult(label, None, str(e) or e.__class__.__name__, key)
+
+    async def _move(self, remote_path: str, folder_path: str, name: str, key: str) -> UploadResult:
+        try:
+            async with self._semaphore:
+                moved_to = await self._nextcloud.move_unique(remote_path, folder_path, name)
+            return UploadResult(name, moved_to, None, key)
+        except Exception as e:
+            logger.exception("Move of %s to %s failed", remote_path, folder_path)
+            return UploadResult(name, None, str(e) or e.__class__.__name__, key)
+
+    async def _upload_and_copy(
+        self, local_path: str, folder_path: str, name: str, copy_folder: str, copy_name: str, key: str, copy_key: str,
+    ) -> List[UploadResult]:
+        if key in self._done:
+            first = UploadResult(name, self._done[key], None, key)
+        else:
+            first = await self._upload(local_path, folder_path, name, True, name, key)
+        if copy_key in self._done:
+            return [first, UploadResult(copy_name, self._done[copy_key], None, copy_key)]
+        if not first.ok:
+            # Fall back to a regular upload for the second copy
+            return [first, await self._upload(local_path, copy_folder, copy_name, True, copy_name, copy_key)]
+        try:
+            async with self._semaphore:
+                remote_path = await self._nextcloud.copy_unique(first.remote_path, copy_folder, copy_name)
+            return [first, UploadResult(copy_name, remote_path, None, copy_key)]
+        except Exception:
+            logger.warning("Server-side copy of %s failed, uploading again", first.remote_path, exc_info=True)
+            return [first, await self._upload(local_path, copy_folder, copy_name, True, copy_name, copy_key)]
+
+    async def wait(self) -> List[UploadResult]:
+        results: List[UploadResult] = []
+        for outcome in await asyncio.gather(*self._tasks):
+            if isinstance(outcome, list):
+                results.extend(outcome)
+            else:
+                results.append(outcome)
+        return self._reused + results + self._failures
@@ -1,10 +1,10 @@
 import io
 import json
-import time
-from typing import Optional
+import mimetypes
+import os
+from typing import Dict, List, Tuple
 
 import aiohttp
-import asyncio
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from config import (
@@ -14,6 +14,8 @@ from config import (
     VSEGPT_STT_MODEL,
     BOT_TITLE,
 )
+from bot.utils.metrics import track
+from bot.utils.ratelimit import TokenBucketLimiter, parse_retry_after
 
 
 HEADERS_JSON = {
@@ -28,56 +30,78 @@ HEADERS_MULTI = {
 }
 
 
-_last_call_ts: float = 0.0
+# Separate budgets so transcription and chat requests do not queue behind each other
+stt_limiter = TokenBucketLimiter(
+    "vsegpt /audio/transcriptions",
+    rate=float(os.getenv("VSEGPT_STT_RATE", "0.5")),
+    burst=int(os.getenv("VSEGPT_STT_BURST", "2")),
+    max_in_flight=int(os.getenv("VSEGPT_STT_CONCURRENCY", "3")),
+)
+chat_limiter = TokenBucketLimiter(
+    "vsegpt /chat/completions",
+    rate=float(os.getenv("VSEGPT_CHAT_RATE", "0.5")),
+    burst=int(os.getenv("VSEGPT_CHAT_BURST", "2")),
+    max_in_flight=int(os.getenv("VSEGPT_CHAT_CONCURRENCY", "4")),
+)
 
 
-async def _throttle():
-    global _last_call_ts
-    now = time.time()
-    delta = now - _last_call_ts
-    if delta < 2.0:
-        await asyncio.sleep(2.0 - delta)
-    _last_call_ts = time.time()
+def _check_throttled(limiter: TokenBucketLimiter, resp: aiohttp.ClientResponse) -> None:
+    if resp.status == 429 or resp.status >= 500:
+        limiter.backoff(parse_retry_after(resp.headers.get("Retry-After")))
+    elif resp.status == 200:
+        limiter.success()
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=6))
 async def transcribe_audio(local_mp3_path: str, language: str = "ru") -> str:
     url = f"{VSEGPT_BASE_URL}/audio/transcriptions"
-    await _throttle()
     with open(local_mp3_path, "rb") as audio_file:
         data = aiohttp.FormData()
-        data.add_field("file", audio_file, filename="audio.mp3", content_type="audio/mpeg")
+        ext = os.path.splitext(local_mp3_path)[1].lower() or ".mp3"
+        content_type = mimetypes.guess_type(f"audio{ext}")[0] or "audio/mpeg"
+        data.add_field("file", audio_file, filename=f"audio{ext}", content_type=content_type)
         data.add_field("model", VSEGPT_STT_MODEL)
         data.add_field("response_format", "json")
         data.add_field("language", language)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=HEADERS_MULTI, data=data) as resp:
-                if resp.status != 200:
-                    text = await resp.text()
-                    raise RuntimeError(f"STT failed {resp.status}: {text}")
-                j = await resp.json()
-                return j.get("text", "")
+        async with stt_limiter.acquire():
+            with track("stt", nbytes=os.path.getsize(local_mp3_path)):
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(url, headers=HEADERS_MULTI, data=data) as resp:
+                        _check_throttled(stt_limiter, resp)
+                        if resp.status != 200:
+                            text = await resp.text()
+                            raise RuntimeError(f"STT failed {resp.status}: {text}")
+                        j = await resp.json()
+                        return j.get("text", "")
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=6))
-async def structure_text(system_prompt: str, raw_text: str) -> str:
+async def chat_completion(messages: List[Dict[str, str]], max_tokens: int = 4000, temperature: float = 0.3) -> Tuple[str, Dict[str, int]]:
+    """Return the reply text and the provider's token usage block."""
     url = f"{VSEGPT_BASE_URL}/chat/completions"
-    await _throttle()
     payload = {
         "model": VSEGPT_CHAT_MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": raw_text},
-        ],
-        "max_tokens": 4000,
-        "temperature": 0.3,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=HEADERS_JSON, json=payload) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                raise RuntimeError(f"LLM failed {resp.status}: {text}")
-            j = await resp.json()
-            choice = j.get("choices", [{}])[0]
-            content = choice.get("message", {}).get("content", "")
-            return content
+    async with chat_limiter.acquire():
+        with track("llm"):
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, headers=HEADERS_JSON, json=payload) as resp:
+                    _check_throttled(chat_limiter, resp)
+                    if resp.status != 200:
+                        text = await resp.text()
+                        raise RuntimeError(f"LLM failed {resp.status}: {text}")
+                    j = await resp.json()
+                    choice = j.get("choices", [{}])[0]
+                    content = choice.get("message", {}).get("content", "")
+                    return content, j.get("usage") or {}
+
+
+async def structure_text(system_prompt: str, raw_text: str) -> str:
+    content, _usage = await chat_completion([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": raw_text},
+    ])
+    return content
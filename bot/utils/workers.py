@@ -0,0 +1,34 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+PROCESS_POOL_SIZE = int(os.getenv("PROCESS_POOL_SIZE", str(max(1, (os.cpu_count() or 2) - 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_SIZE)
+    return _pool
+
+
+async def run_in_process(kind: str, limit: int, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a CPU-heavy ``fn`` in the shared process pool, at most ``limit`` calls of ``kind`` at a time."""
+    semaphore = _limits.get(kind)
+    if semaphore is None:
+        semaphore = _limits[kind] = asyncio.Semaphore(limit)
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Updates beyond this many in flight are refused with 503 and redelivered by Telegram later
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "64"))
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """aiogram's webhook handler, answering at once and processing updates in the background.
+
+    On top of the secret check it refuses malformed bodies with 400 and, once ``max_in_flight``
+    updates are being processed, new deliveries with 503 so Telegram redelivers them later.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret_token: str = WEBHOOK_SECRET, max_in_flight: int = WEBHOOK_MAX_IN_FLIGHT) -> None:
+        if not secret_token:
+            raise ValueError("a webhook secret token is required")
+        super().__init__(dp, bot, handle_in_background=True, secret_token=secret_token)
+        self._max_in_flight = max_in_flight
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if self.in_flight >= self._max_in_flight:
+            logger.warning("Webhook saturated (%d updates in flight), asking Telegram to retry", self.in_flight)
+            return web.Response(status=503)
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+            Update.model_validate(update, context={"bot": bot})
+        except Exception:
+            return web.Response(status=400)
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await super()._background_feed_update(bot, update)
+        except Exception:
+            logger.exception("Failed to process update %s", update.get("update_id"))
+
+    async def drain(self) -> None:
+        if self._background_feed_update_tasks:
+            await asyncio.gather(*self._background_feed_update_tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        # Called on app shutdown, after the server stopped accepting requests
+        await self.drain()
+        await super().close()
+
+
+def build_webhook_app(handler: WebhookHandler, path: str = WEBHOOK_PATH) -> web.Application:
+    app = web.Application()
+    handler.register(app, path=path)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    if not WEBHOOK_BASE_URL:
+        raise RuntimeError("WEBHOOK_BASE_URL is not set")
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is not set")
+    handler = WebhookHandler(dp, bot)
+    runner = web.AppRunner(build_webhook_app(handler))
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    await dp.emit_startup(bot=bot)
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info("Webhook server listening on %s:%d%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Stops accepting updates, then drains the in-flight ones (WebhookHandler.close)
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
@@ -1,29 +1,109 @@
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
 import asyncio
 import logging
+import os
+import sys
+from functools import partial
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import TELEGRAM_BOT_TOKEN
+from bot.handlers.browse_handler import register_browse_handlers
 from bot.handlers.chat_handler import register_chat_handlers
 from bot.handlers.private_handler import register_private_handlers
+from bot.handlers.search_handler import register_search_handlers
 from bot.handlers.file_handler import register_file_handlers
+from bot.utils.albums import AlbumCollector
+from bot.utils.fsm_storage import SQLiteStorage
+from bot.utils.nextcloud import NextCloudClient, set_client
+from bot.utils.library import LibraryCache
+from bot.utils.metrics import start_metrics_server
+from bot.utils.relay import StagingSweeper
+from bot.utils.reposter import LibraryReposter
+from bot.utils.search_index import SearchIndex
+from bot.utils.jobs import JobQueue, JobWorkerPool
+from bot.utils.lecture_pipeline import LECTURE_JOB, process_lecture_job
+from bot.utils.spool import Spool
+from bot.utils.startup import StartupTimer, run_checks
+from bot.utils.tree_index import TreeIndex
+from bot.utils.workers import shutdown_process_pool
+from bot.webhook import run_webhook
+
+
+# "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
 
 
 async def main() -> None:
+    startup = StartupTimer(_STARTED)
+    startup.mark("imports")
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     if not TELEGRAM_BOT_TOKEN:
         raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
 
     bot = Bot(token=TELEGRAM_BOT_TOKEN, parse_mode=ParseMode.HTML)
-    dp = Dispatcher(storage=MemoryStorage())
+    tree = TreeIndex()
+    nextcloud = NextCloudClient(index=tree)
+    set_client(nextcloud)
+    library = LibraryCache(nextcloud)
+    reposter = LibraryReposter(library)
+    sweeper = StagingSweeper(nextcloud)
+    spool = Spool()
+    startup.mark("services")
+    spool.enforce_quota()
+    logging.info("Spool usage: %s", spool.usage())
+    startup.mark("spool scan")
+    search = SearchIndex()
+    jobs = JobQueue()
+    workers = JobWorkerPool(
+        jobs, {LECTURE_JOB: partial(process_lecture_job, bot=bot, nextcloud=nextcloud, spool=spool, jobs=jobs, search=search)}
+    )
+    dp = Dispatcher(
+        storage=SQLiteStorage(), nextcloud=nextcloud, library=library, reposter=reposter, jobs=jobs, spool=spool,
+        albums=AlbumCollector(), tree=tree, search=search,
+    )
 
     register_chat_handlers(dp)
+    # Before the upload flow, so commands are not taken for a topic or a note
+    register_browse_handlers(dp)
+    register_search_handlers(dp)
     register_private_handlers(dp)
     register_file_handlers(dp)
+    startup.mark("queue, storage and handlers")
 
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    metrics_runner = await start_metrics_server()
+    workers.start()
+    tree.start(nextcloud)
+    search.start()
+    sweeper.start()
+    startup.mark("metrics and workers")
+    startup.log()
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        await workers.close()
+        await search.close()
+        jobs.close()
+        await dp.storage.close()
+        await reposter.close()
+        await sweeper.close()
+        await tree.close()
+        await nextcloud.close()
+        shutdown_process_pool()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="verify ffmpeg, wkhtmltopdf and fonts, then exit")
+    if parser.parse_args().check:
+        sys.exit(0 if run_checks() else 1)
     asyncio.run(main())
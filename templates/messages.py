@@ -1,14 +1,15 @@
 from datetime import datetime
-from typing import Dict, Optional
+from html import escape
+from typing import Dict, List, Optional
 
 
-def build_library_message(links: Dict[str, str], include_updated_at: bool = False) -> str:
+def build_library_message(links: Dict[str, str], include_updated_at: bool = False, updated_at: Optional[datetime] = None) -> str:
     lines = ["📚 <b>БИБЛИОТЕКА ЛЕКЦИЙ ЭОСО-01-25</b>", ""]
     for name, url in links.items():
         lines.append(f"🔗 <a href=\"{url}\">{name}</a>")
     if include_updated_at:
         lines.append("")
-        lines.append(f"📅 Последнее обновление: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
+        lines.append(f"📅 Последнее обновление: {(updated_at or datetime.now()).strftime('%d.%m.%Y %H:%M')}")
     return "\n".join(lines)
 
 
@@ -33,3 +34,142 @@ def build_scan_intro() -> str:
         "📑 <b>СКАН КОНСПЕКТА</b>\n\n"
         "Отправьте 1 или несколько фотографий конспекта. По кнопке \"✅ Готово\" мы соберём PDF со снимков и вернёмся в загрузку занятия."
     )
+
+
+_STAGE_TITLES = {
+    "folder": "папка занятия",
+    "convert": "конвертация аудио",
+    "transcribe": "распознавание речи",
+    "structure": "структурирование конспекта",
+    "render": "сборка PDF конспекта",
+    "render_scan": "сборка PDF скана",
+    "upload": "загрузка в NextCloud",
+}
+
+_RETRY_HINT = "Выполненные этапы сохранены: «🔁 Повторить» продолжит обработку с места ошибки."
+
+
+def build_job_resumed(stages: List[str]) -> str:
+    done = ", ".join(_STAGE_TITLES.get(s, s) for s in stages)
+    return f"♻️ Продолжение с сохранённого: {escape(done)}"
+
+
+def build_job_error(error: Exception, failures) -> str:
+    """``failures`` are (stage, error) pairs recorded during the run."""
+    lines = ["❌ <b>Ошибка обработки</b>", ""]
+    for stage, message in failures:
+        lines.append(f"Этап «{escape(_STAGE_TITLES.get(stage, stage))}»: {escape(message[:200])}")
+    if not failures:
+        lines.append(escape((str(error) or error.__class__.__name__)[:200]))
+    lines += ["", _RETRY_HINT]
+    return "\n".join(lines)
+
+
+def build_upload_report(results, retry: bool = False) -> str:
+    failed = [r for r in results if r.error]
+    if not failed:
+        head = "✅ Готово! Материалы загружены в NextCloud."
+    elif len(failed) == len(results):
+        head = "❌ Не удалось загрузить материалы в NextCloud."
+    else:
+        head = "⚠️ Готово, но часть материалов не загружена."
+    lines = [head]
+    if results:
+        lines.append("")
+    for r in results:
+        if r.error:
+            lines.append(f"❌ {escape(r.label)} — {escape(r.error[:200])}")
+        else:
+            lines.append(f"✅ {escape(r.label)}")
+    if retry:
+        lines += ["", _RETRY_HINT]
+    return "\n".join(lines)
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} ГБ"
+
+
+def build_stats_message(rows, spool_usage: Dict[str, int]) -> str:
+    lines = ["📊 <b>СТАТИСТИКА</b>", ""]
+    if not rows:
+        lines.append("Пока нет данных.")
+    for stage, count, errors, p50, p95, nbytes in rows:
+        line = f"<code>{escape(stage)}</code>: {count} шт., p50 {p50:.2f} с, p95 {p95:.2f} с"
+        if errors:
+            line += f", ошибок {errors}"
+        if nbytes:
+            line += f", {_format_bytes(nbytes)}"
+        lines.append(line)
+    lines += [
+        "",
+        f"💾 Спул: {_format_bytes(spool_usage['bytes'])} из {_format_bytes(spool_usage['quota_bytes'])}, "
+        f"сессий {spool_usage['sessions']} (в работе {spool_usage['pinned']})",
+    ]
+    return "\n".join(lines)
+
+
+def build_job_status(topic: str, steps: List[str]) -> str:
+    lines = ["⏳ <b>ОБРАБОТКА МАТЕРИАЛОВ</b>", f"<b>Тема:</b> {escape(topic)}", ""]
+    lines.extend(steps)
+    if steps:
+        lines.append("")
+    lines.append("Материалы в очереди на обработку, сообщение обновится по мере готовности.")
+    return "\n".join(lines)
+
+
+def _relative(path: str, root: str) -> str:
+    rest = path[len(root):].strip("/") if path.startswith(root) else path
+    return " / ".join(rest.split("/")) if rest else "Библиотека"
+
+
+def build_recent_message(items, root: str) -> str:
+    """``items`` are (index entry, link to its folder or None) pairs, newest first."""
+    lines = ["🕘 <b>НЕДАВНИЕ ФАЙЛЫ</b>", ""]
+    if not items:
+        lines.append("Пока ничего не загружено.")
+    for e, url in items:
+        folder = e.path.rsplit("/", 1)[0]
+        when = datetime.fromtimestamp(e.modified).strftime("%d.%m %H:%M") if e.modified else ""
+        place = escape(_relative(folder, root))
+        if url:
+            place = f"<a href=\"{escape(url)}\">{place}</a>"
+        lines.append(f"📄 <b>{escape(e.name)}</b> — {place} {when}".rstrip())
+    return "\n".join(lines)
+
+
+def build_browse_message(path: str, children, root: str, url: Optional[str] = None) -> str:
+    title = escape(_relative(path, root))
+    if url:
+        title = f"<a href=\"{escape(url)}\">{title}</a>"
+    lines = [f"📂 <b>{title}</b>", ""]
+    files = [c for c in children if not c.is_dir]
+    folders = [c for c in children if c.is_dir]
+    if not children:
+        lines.append("Папка пуста.")
+    elif folders and not files:
+        lines.append(f"Папок: {len(folders)}")
+    for f in files[:50]:
+        lines.append(f"📄 {escape(f.name)} ({_format_bytes(f.size)})")
+    if len(files) > 50:
+        lines.append(f"… и ещё {len(files) - 50}")
+    return "\n".join(lines)
+
+
+def build_search_message(query: str, items) -> str:
+    """``items`` are (search hit, link to the lecture PDF or None) pairs, best first."""
+    lines = [f"🔎 <b>ПОИСК:</b> {escape(query)}", ""]
+    if not items:
+        lines.append("Ничего не найдено.")
+    for hit, url in items:
+        title = escape(hit.topic)
+        if url:
+            title = f"<a href=\"{escape(url)}\">{title}</a>"
+        where = " · ".join(escape(x) for x in (hit.discipline, hit.date_str, hit.lesson_type) if x)
+        source = "конспект" if hit.kind == "conspect" else "расшифровка"
+        lines += [f"📄 <b>{title}</b>", f"{where} · {source}", f"<i>{hit.snippet_html}</i>", ""]
+    return "\n".join(lines).rstrip()
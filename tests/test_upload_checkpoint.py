@@ -0,0 +1,89 @@
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+
+from bot.utils.jobs import JobStages
+from bot.utils.lecture_pipeline import UPLOAD, JobProgress, _run_lecture_pipeline
+
+
+class FakeNextCloud:
+    """Records uploads; the first upload of ``flaky`` fails."""
+
+    def __init__(self, flaky: str) -> None:
+        self.flaky = flaky
+        self.uploaded = []
+        self.taken = set()
+
+    async def create_folder_structure(self, discipline, date_str=None, lesson_type=None):
+        return f"Lib/{discipline}/01.01.2026"
+
+    @contextlib.asynccontextmanager
+    async def upload_batch(self):
+        yield
+
+    def _unique(self, folder_path, name):
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        while f"{folder_path}/{candidate}" in self.taken:
+            candidate = f"{stem}_{n}{ext}"
+            n += 1
+        self.taken.add(f"{folder_path}/{candidate}")
+        return f"{folder_path}/{candidate}"
+
+    async def upload_file_unique(self, local_path, folder_path, name):
+        if local_path == self.flaky:
+            self.flaky = None
+            raise RuntimeError("connection reset")
+        self.uploaded.append(local_path)
+        return self._unique(folder_path, name)
+
+    async def upload_file_to_nextcloud(self, local_path, remote_path):
+        self.uploaded.append(local_path)
+        self.taken.add(remote_path)
+
+
+class UploadCheckpointTest(unittest.IsolatedAsyncioTestCase):
+    async def test_retry_uploads_only_the_failed_one_of_same_named_files(self):
+        work_dir = tempfile.mkdtemp()
+        paths = []
+        for i in range(2):
+            path = os.path.join(work_dir, f"u{i}_slides.pdf")
+            with open(path, "w") as f:
+                f.write(str(i))
+            paths.append(path)
+        note_lookalike = os.path.join(work_dir, "u2_note.md")
+        with open(note_lookalike, "w") as f:
+            f.write("user file")
+        payload = {
+            "topic": "Тема",
+            "discipline": "Математика",
+            "lesson_type": "Лекция",
+            "text_notes": ["заметка"],
+            "files": [
+                {"path": paths[0], "name": "slides.pdf", "kind": "file"},
+                {"path": paths[1], "name": "slides.pdf", "kind": "file"},
+                {"path": note_lookalike, "name": "заметка.md", "kind": "file"},
+            ],
+        }
+        nextcloud = FakeNextCloud(flaky=paths[1])
+        stages = JobStages(None, 0)
+        progress = JobProgress(None, None, None, payload["topic"])
+
+        first = await _run_lecture_pipeline(payload, progress, nextcloud, work_dir, stages)
+        self.assertEqual([r.ok for r in first].count(False), 1)
+        checkpoint = json.loads(stages.partial(UPLOAD))
+        self.assertEqual(len(checkpoint), 3)
+
+        second = await _run_lecture_pipeline(payload, progress, nextcloud, work_dir, stages)
+        self.assertTrue(all(r.ok for r in second))
+        # Each input went up exactly once: the retry only sent the file that failed
+        self.assertEqual(sorted(nextcloud.uploaded), sorted(paths + [note_lookalike, os.path.join(work_dir, "note.md")]))
+        remote = sorted(r.remote_path for r in second)
+        self.assertEqual(len(set(remote)), 4)
+        self.assertEqual(stages.artifact(UPLOAD) and len(json.loads(stages.artifact(UPLOAD))), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import unittest
+
+from aiohttp.test_utils import AioHTTPTestCase
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+
+from bot.webhook import WebhookHandler, build_webhook_app
+
+
+SECRET = "test-secret"
+PATH = "/telegram/webhook"
+
+
+def make_update(update_id: int, text: str = "hello") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+class WebhookTest(AioHTTPTestCase):
+    async def get_application(self):
+        self.release = asyncio.Event()
+        self.started = asyncio.Queue()
+        self.handled = asyncio.Queue()
+        self.dp = Dispatcher()
+
+        @self.dp.message()
+        async def on_message(message: Message):
+            await self.started.put(message.text)
+            await self.release.wait()
+            await self.handled.put(message.text)
+
+        self.bot = Bot(token="42:TEST")
+        self.handler = WebhookHandler(self.dp, self.bot, secret_token=SECRET, max_in_flight=2)
+        return build_webhook_app(self.handler, PATH)
+
+    async def post(self, body, secret: str = SECRET):
+        data = body if isinstance(body, (str, bytes)) else json.dumps(body)
+        return await self.client.post(
+            PATH, data=data, headers={"X-Telegram-Bot-Api-Secret-Token": secret, "Content-Type": "application/json"}
+        )
+
+    async def test_wrong_secret_is_rejected(self):
+        resp = await self.post(make_update(1), secret="wrong")
+        self.assertEqual(resp.status, 401)
+        resp = await self.client.post(PATH, json=make_update(2))
+        self.assertEqual(resp.status, 401)
+        self.assertEqual(self.handler.in_flight, 0)
+
+    async def test_update_is_acknowledged_before_it_is_handled(self):
+        resp = await self.post(make_update(1, "first"))
+        self.assertEqual(resp.status, 200)
+        # The handler is still blocked, yet the request has already been answered
+        self.assertEqual(await asyncio.wait_for(self.started.get(), 1), "first")
+        self.assertTrue(self.handled.empty())
+        self.assertEqual(self.handler.in_flight, 1)
+        self.release.set()
+        self.assertEqual(await asyncio.wait_for(self.handled.get(), 1), "first")
+        await self.handler.drain()
+        self.assertEqual(self.handler.in_flight, 0)
+
+    async def test_saturated_webhook_asks_for_redelivery(self):
+        for i in (1, 2):
+            self.assertEqual((await self.post(make_update(i))).status, 200)
+        resp = await self.post(make_update(3))
+        self.assertEqual(resp.status, 503)
+        self.release.set()
+        await self.handler.drain()
+        self.assertEqual((await self.post(make_update(4))).status, 200)
+        await self.handler.drain()
+
+    async def test_malformed_body_is_rejected(self):
+        self.assertEqual((await self.post("{not json")).status, 400)
+        self.assertEqual((await self.post({"message": "no update id"})).status, 400)
+        self.assertEqual(self.handler.in_flight, 0)
+
+    def test_secret_is_required(self):
+        with self.assertRaises(ValueError):
+            WebhookHandler(self.dp, self.bot, secret_token="")
+
+
+if __name__ == "__main__":
+    unittest.main()